@@ -0,0 +1,35 @@
+"""
+Measure how long it takes to start collaborator. Each command is run in a fresh interpreter several times and the
+median wall clock time is reported, so the numbers include interpreter start up as a user would see it.
+
+Run with: python benchmarks/startup.py
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = {
+    "python (baseline)": [sys.executable, "-c", "pass"],
+    "import collaborator": [sys.executable, "-c", "import collaborator"],
+    "import collaborator.graph_utils": [sys.executable, "-c", "import collaborator.graph_utils"],
+    "collaborator --help": [sys.executable, "-m", "collaborator", "--help"],
+}
+RUNS = 10
+
+
+def time_command(command):
+    """
+    Run a command RUNS times and return the median time it took in seconds.
+    """
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    for name, command in COMMANDS.items():
+        print("{:<35} {:>8.1f} ms".format(name, time_command(command) * 1000))
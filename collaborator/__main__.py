@@ -0,0 +1,3 @@
+from collaborator.cli import main
+
+main()
@@ -0,0 +1,133 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple, Union
+
+if TYPE_CHECKING:
+    from collaborator.playlist import SpotifyArtist, SpotifyPlaylistTrack
+
+
+class BitmapIndex(object):
+    def __init__(
+        self,
+        tracks_by_time: List["SpotifyPlaylistTrack"],
+        artists: Dict[str, "SpotifyArtist"],
+    ):
+        """
+        An index of which tracks on a playlist were added by each user, are by each artist and are in each genre. Each
+        track gets a dense integer id from its position in tracks_by_time, and each user, artist and genre has a
+        bitset (stored as a Python int) with the bits of its tracks' ids set. Filters are combined with bitwise
+        ands/ors rather than looping over tracks, and because ids are in time order a range of dates is just a range of
+        bits.
+
+        :param tracks_by_time: The tracks on the playlist, sorted by the time they were added.
+        :param artists: The SpotifyArtist objects for the artists on the playlist, keyed by uri. Used for genres.
+        """
+        self.tracks = list(tracks_by_time)
+        self.added_at = [track.added_at for track in self.tracks]
+
+        user_ids = dict()
+        artist_ids = dict()
+        for track_id, track in enumerate(self.tracks):
+            user_ids.setdefault(track.added_by.uri, []).append(track_id)
+            for artist in track.simple_artist_list:
+                artist_ids.setdefault(artist["uri"], []).append(track_id)
+
+        # Bitsets of track ids keyed by user uri, artist uri and genre respectively.
+        self.user_bitmaps = {user: _ids_to_bitmap(ids) for user, ids in user_ids.items()}
+        self.artist_bitmaps = {artist: _ids_to_bitmap(ids) for artist, ids in artist_ids.items()}
+        self.genre_bitmaps = dict()
+        for artist_uri, bitmap in self.artist_bitmaps.items():
+            if artist_uri in artists:
+                for genre in artists[artist_uri].genres:
+                    self.genre_bitmaps[genre] = self.genre_bitmaps.get(genre, 0) | bitmap
+
+    def query_bitmap(
+        self,
+        user: Union[str, Iterable[str]] = None,
+        artist: Union[str, Iterable[str]] = None,
+        genre: Union[str, Iterable[str]] = None,
+        added_between: Tuple[datetime, datetime] = None,
+    ) -> int:
+        """
+        Find the ids of the tracks that match every filter given. See query for the filters.
+        :return: A bitset of the matching track ids.
+        """
+        # Start with every track and narrow it down.
+        result = (1 << len(self.tracks)) - 1
+        for bitmaps, keys in (
+            (self.user_bitmaps, user),
+            (self.artist_bitmaps, artist),
+            (self.genre_bitmaps, genre),
+        ):
+            if keys is None:
+                continue
+            if isinstance(keys, str):
+                keys = [keys]
+            field_bitmap = 0
+            for key in keys:
+                field_bitmap |= bitmaps.get(key, 0)
+            result &= field_bitmap
+
+        if added_between is not None:
+            start, end = added_between
+            first_id = bisect_left(self.added_at, start) if start is not None else 0
+            end_id = bisect_right(self.added_at, end) if end is not None else len(self.tracks)
+            result &= ((1 << end_id) - 1) ^ ((1 << first_id) - 1)
+
+        return result
+
+    def query(
+        self,
+        user: Union[str, Iterable[str]] = None,
+        artist: Union[str, Iterable[str]] = None,
+        genre: Union[str, Iterable[str]] = None,
+        added_between: Tuple[datetime, datetime] = None,
+    ) -> List["SpotifyPlaylistTrack"]:
+        """
+        Find the tracks that match every filter given. Each of user, artist and genre can be a single value or several,
+        in which case tracks matching any of them match.
+        :param user: The uri(s) of the users who added the tracks.
+        :param artist: The uri(s) of the artists on the tracks.
+        :param genre: The genre(s) of the tracks.
+        :param added_between: A tuple of the earliest and latest times the tracks were added, inclusive. Either can be
+                              None to leave that end open. Spotify times are time zone aware, so these should be too.
+        :return: A list of the matching SpotifyPlaylistTrack objects, sorted by the time they were added.
+        """
+        return self.bitmap_to_tracks(
+            self.query_bitmap(user=user, artist=artist, genre=genre, added_between=added_between)
+        )
+
+    def bitmap_to_tracks(self, bitmap: int) -> List["SpotifyPlaylistTrack"]:
+        """
+        Get the tracks for a bitset of track ids.
+        :param bitmap: A bitset of track ids.
+        :return: A list of the SpotifyPlaylistTrack objects, sorted by the time they were added.
+        """
+        # Clearing bits one at a time on an int copies it every time, so scan its bytes instead.
+        tracks = []
+        for byte_index, byte in enumerate(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")):
+            while byte:
+                lowest_bit = byte & -byte
+                tracks.append(self.tracks[byte_index * 8 + lowest_bit.bit_length() - 1])
+                byte ^= lowest_bit
+        return tracks
+
+    @staticmethod
+    def count(bitmap: int) -> int:
+        """
+        Count the tracks in a bitset of track ids.
+        :param bitmap: A bitset of track ids.
+        :return: The number of tracks.
+        """
+        return bin(bitmap).count("1")
+
+
+def _ids_to_bitmap(ids: List[int]) -> int:
+    """
+    Build a bitset from a sorted list of ids. Setting bits one at a time on an int copies it every time, so set them in
+    a bytearray and convert it in one go.
+    """
+    bits = bytearray(ids[-1] // 8 + 1)
+    for track_id in ids:
+        bits[track_id >> 3] |= 1 << (track_id & 7)
+    return int.from_bytes(bits, "little")
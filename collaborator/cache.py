@@ -0,0 +1,214 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable
+
+# Where the cache is stored if COLLABORATOR_CACHE_PATH isn't set. This is in the user's own cache directory rather
+# than somewhere shared like /tmp, as anyone who can write to the cache can run code in every process that reads it.
+DEFAULT_CACHE_PATH = os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "collaborator", "cache.sqlite3"
+)
+# Used as the default ttl so that None can mean "keep forever".
+DEFAULT_TTL = object()
+# How often in seconds to check whether another process has finished creating a value in get_or_set.
+LOCK_POLL_INTERVAL = 0.05
+# How many writes each SharedCache makes between removing expired values, so the database doesn't grow forever.
+CLEAR_EXPIRED_EVERY = 100
+
+
+class SharedCache(object):
+    def __init__(self, path: str = "", default_ttl: float = 300):
+        """
+        A key/value cache stored in a local SQLite database, so that it can be shared between all the processes on a
+        machine (e.g. the workers of a pre-fork WSGI server). Values are pickled, so anything picklable can be cached.
+
+        :param path: The path to the SQLite database file. Defaults to the COLLABORATOR_CACHE_PATH environment
+                     variable, or DEFAULT_CACHE_PATH if that isn't set. Values are unpickled when read, so this must
+                     not be writable by untrusted users. A database owned by another user is refused.
+        :param default_ttl: How long values stay in the cache in seconds if no ttl is given when they're set. Use None
+                            to keep values forever.
+        """
+        self.path = path or os.getenv("COLLABORATOR_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.default_ttl = default_ttl
+        # SQLite connections can't be shared between threads or across a fork, so each thread in each process gets
+        # its own.
+        self._local = threading.local()
+        # The number of values this instance has written since it last removed expired values.
+        self._writes_since_clear = 0
+
+        if self.path == DEFAULT_CACHE_PATH:
+            os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        # Create the database readable and writable only by us, unless it already exists.
+        os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+        if hasattr(os, "getuid") and os.stat(self.path).st_uid != os.getuid():
+            raise RuntimeError(
+                "The cache at {} is owned by another user. Set COLLABORATOR_CACHE_PATH to a file only you can "
+                "write to".format(self.path)
+            )
+
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+            # Leases on the keys whose values are being created by get_or_set.
+            connection.execute("CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, expires REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)")
+        # Each worker tidies up when it starts, as well as every CLEAR_EXPIRED_EVERY writes.
+        self.clear_expired()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Get a value from the cache.
+        :param key: The key the value was stored under.
+        :param default: What to return if the key isn't in the cache or has expired.
+        :return: The cached value, or default.
+        """
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Get several values from the cache in one query.
+        :param keys: The keys the values were stored under.
+        :return: A dictionary of the cached values keyed by key. Keys that aren't in the cache or have expired are left
+                 out.
+        """
+        keys = list(keys)
+        values = dict()
+        # SQLite limits the number of parameters in a single query.
+        max_keys_per_query = 500
+        for first_key in range(0, len(keys), max_keys_per_query):
+            key_batch = keys[first_key : first_key + max_keys_per_query]
+            rows = self._connection().execute(
+                "SELECT key, value FROM cache WHERE key IN ({}) AND (expires IS NULL OR expires > ?)".format(
+                    ",".join("?" * len(key_batch))
+                ),
+                key_batch + [time.time()],
+            )
+            for key, value in rows:
+                values[key] = pickle.loads(value)
+
+        return values
+
+    def set(self, key: str, value: Any, ttl: float = DEFAULT_TTL):
+        """
+        Store a value in the cache, replacing anything already stored under the key.
+        :param key: The key to store the value under.
+        :param value: The value to store. Must be picklable.
+        :param ttl: How long to keep the value for in seconds. None keeps it forever. Defaults to default_ttl.
+        """
+        self.set_many({key: value}, ttl=ttl)
+
+    def set_many(self, values: Dict[str, Any], ttl: float = DEFAULT_TTL):
+        """
+        Store several values in the cache in one transaction.
+        :param values: A dictionary of the values to store keyed by key. Values must be picklable.
+        :param ttl: How long to keep the values for in seconds. None keeps them forever. Defaults to default_ttl.
+        """
+        if ttl is DEFAULT_TTL:
+            ttl = self.default_ttl
+        expires = time.time() + ttl if ttl is not None else None
+
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                [
+                    (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires)
+                    for key, value in values.items()
+                ],
+            )
+
+        self._writes_since_clear += len(values)
+        if self._writes_since_clear >= CLEAR_EXPIRED_EVERY:
+            self.clear_expired()
+
+    def get_or_set(
+        self, key: str, factory: Callable[[], Any], ttl: float = DEFAULT_TTL, lock_timeout: float = 60
+    ) -> Any:
+        """
+        Get a value from the cache, creating and storing it if it isn't there. Only one process at a time creates the
+        value for a key; any others asking for it meanwhile wait for it to be stored rather than calling factory too.
+        :param key: The key the value is stored under.
+        :param factory: A function taking no arguments that creates the value if it isn't in the cache.
+        :param ttl: How long to keep a newly created value for in seconds. None keeps it forever. Defaults to
+                    default_ttl.
+        :param lock_timeout: How long in seconds other processes wait for the value before assuming whatever was
+                             creating it has died and creating it themselves.
+        :return: The cached or newly created value.
+        """
+        # Use a sentinel rather than None in case None has been cached.
+        missing = object()
+        while True:
+            value = self.get(key, default=missing)
+            if value is not missing:
+                return value
+
+            if self._acquire_lock(key, lock_timeout):
+                try:
+                    # Another process may have stored the value between checking and getting the lock.
+                    value = self.get(key, default=missing)
+                    if value is missing:
+                        value = factory()
+                        self.set(key, value, ttl=ttl)
+                    return value
+                finally:
+                    self._release_lock(key)
+
+            time.sleep(LOCK_POLL_INTERVAL)
+
+    def delete(self, key: str):
+        """
+        Remove a value from the cache if it's there.
+        :param key: The key the value is stored under.
+        """
+        with self._connection() as connection:
+            connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear_expired(self):
+        """
+        Remove every expired value (and lease) from the cache. Expired values are never returned, this just frees up
+        the space. Called every CLEAR_EXPIRED_EVERY writes, so there's usually no need to call it directly.
+        """
+        self._writes_since_clear = 0
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+            connection.execute("DELETE FROM locks WHERE expires <= ?", (now,))
+
+    def _acquire_lock(self, key: str, lock_timeout: float) -> bool:
+        """
+        Take the lease on a key if nobody else holds it or their lease has expired.
+        :return: True if the lease was taken, False if someone else holds it.
+        """
+        connection = self._connection()
+        now = time.time()
+        # Take the write lock up front so checking for and taking the lease happen atomically.
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM locks WHERE key = ? AND expires <= ?", (key, now))
+            acquired = connection.execute(
+                "INSERT OR IGNORE INTO locks (key, expires) VALUES (?, ?)", (key, now + lock_timeout)
+            ).rowcount == 1
+        except BaseException:
+            connection.rollback()
+            raise
+        connection.commit()
+        return acquired
+
+    def _release_lock(self, key: str):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM locks WHERE key = ?", (key,))
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Get this thread's connection to the database, opening a new one if this is a new thread or process.
+        """
+        if getattr(self._local, "pid", None) != os.getpid():
+            # Wait for other processes' writes to finish rather than failing.
+            self._local.connection = sqlite3.connect(self.path, timeout=30)
+            # Write ahead logging lets readers carry on while another process is writing.
+            self._local.connection.execute("PRAGMA journal_mode=WAL")
+            self._local.pid = os.getpid()
+
+        return self._local.connection
@@ -0,0 +1,81 @@
+import argparse
+from typing import List
+
+
+def main(argv: List[str] = None):
+    """
+    The collaborator command line entry point. Everything slow to import (Dash, spotipy, requests) is only imported by
+    the command that needs it, so --help and friends start quickly.
+    :param argv: The command line arguments, not including the program name. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(
+        prog="collaborator",
+        description="Dashboard for collaborative playlists, breaking down what's been added and by who.",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    dashboard_parser = subparsers.add_parser("dashboard", help="Run the playlist dashboard locally.")
+    dashboard_parser.add_argument("--host", default="127.0.0.1", help="The address to serve the dashboard on.")
+    dashboard_parser.add_argument("--port", default=8050, type=int, help="The port to serve the dashboard on.")
+    dashboard_parser.add_argument("--debug", action="store_true", help="Run the dashboard in Dash's debug mode.")
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve the dashboard in production with several gunicorn worker processes."
+    )
+    serve_parser.add_argument("--bind", default="0.0.0.0:8050", help="The address and port to serve the dashboard on.")
+    serve_parser.add_argument("--workers", default=4, type=int, help="The number of worker processes to run.")
+
+    summary_parser = subparsers.add_parser(
+        "summary", help="Print some stats about a playlist and the upcoming gigs by artists on it."
+    )
+    summary_parser.add_argument(
+        "--playlist",
+        default="spotify:playlist:1cIYJbMgyTsEfHtPVxWETv",
+        help="The spotify uri for the playlist in the format spotify:playlist:<playlist_id>.",
+    )
+    summary_parser.add_argument("--location", default="London", help="The name of the location to search for gigs.")
+    summary_parser.add_argument("--country", default="UK", help="The country the location is in.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "dashboard":
+        from collaborator.dashboard import app
+
+        app.run_server(host=args.host, port=args.port, debug=args.debug)
+    elif args.command == "serve":
+        serve(bind=args.bind, workers=args.workers)
+    elif args.command == "summary":
+        from collaborator.hack import print_playlist_summary
+
+        print_playlist_summary(playlist_uri=args.playlist, location_name=args.location, country=args.country)
+
+
+def serve(bind: str, workers: int):
+    """
+    Serve the dashboard with gunicorn. Gunicorn is an optional dependency, install it with the production extra.
+    :param bind: The address and port to serve the dashboard on, e.g. "0.0.0.0:8050".
+    :param workers: The number of worker processes to run.
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise RuntimeError(
+            "Serving the dashboard requires gunicorn. Install it with: poetry install --extras production"
+        )
+
+    class DashboardApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", bind)
+            self.cfg.set("workers", workers)
+
+        def load(self):
+            from collaborator.dashboard import server
+
+            return server
+
+    DashboardApplication().run()
+
+
+if __name__ == "__main__":
+    main()
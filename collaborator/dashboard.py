@@ -2,24 +2,69 @@ import dash
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_table
-from dash.dependencies import Input, Output
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+from dash.dependencies import Input, Output, State
+import flask
+import hashlib
 import json
-from collaborator.playlist import SpotifyPlaylist, SpotifyArtist, SpotifyPlaylistTrack
-from collaborator.live_shows import get_events_for_location
-from collaborator.graph_utils import plot_sorted_tracks, create_events_table
+import os
+import time
+from datetime import date
+from collaborator.cache import SharedCache
+from collaborator.genres import ROLLUP_LEVELS
+from collaborator.history import PlaylistHistory
+from collaborator.playlist import SpotifyPlaylist
+from collaborator.live_shows import get_events_for_locations
+from collaborator.graph_utils import plot_history, plot_sorted_tracks, create_events_table
+from collaborator.spotipy_utils import get_spotify_connection
 
 
-client_credentials_manager = SpotifyClientCredentials()
-sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
+external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
 
+# How long to cache things fetched from Spotify and Songkick for, in seconds.
+PLAYLIST_CACHE_TTL = 5 * 60
+# How long other workers wait for a playlist being fetched by one of them before fetching it themselves, in seconds.
+# Big playlists take many calls to Spotify to fetch.
+PLAYLIST_FETCH_TIMEOUT = 10 * 60
+EVENT_CACHE_TTL = 60 * 60
+# Figures are cached by playlist snapshot, but they end with a point for the time they were built so lines reach the
+# present. Their ETags change this often too, so figures are rebuilt and sent again rather than stopping at that point.
+FIGURE_CACHE_TTL = 60 * 60
 
-external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
+# The names of the genre rollup levels to show on the dashboard, keyed by level.
+GENRE_LEVEL_NAMES = {
+    "genre": "Spotify genres",
+    "parent": "Parent genres",
+    "family": "Genre families",
+}
+# Figures of genres rolled up to a level have a grouping of this followed by the level, e.g. genres_parent.
+GENRE_GROUPING_PREFIX = "genres_"
+
+# The figures on the dashboard, keyed by grouping. This is the playlist attribute holding the tracks they plot, or a
+# level of the playlist's genre rollups.
+FIGURE_TITLES = {
+    "tracks_by_user": "Tracks added over time by each user",
+    "tracks_by_artist": "Number of tracks by different artists",
+}
+for level in ROLLUP_LEVELS:
+    FIGURE_TITLES[GENRE_GROUPING_PREFIX + level] = "Number of tracks in different genres ({})".format(
+        GENRE_LEVEL_NAMES[level].lower()
+    )
+# The grouping of the figure plotting the playlist's recorded history, rather than its current tracks.
+HISTORY_GROUPING = "history"
+FIGURE_TITLES[HISTORY_GROUPING] = "Tracks on the playlist over time by each user, including removed tracks"
 
+# Compress responses, figures for big playlists can be large.
 app = dash.Dash(
-    __name__, meta_tags=[{"name": "viewport", "content": "width=device-width"}]
+    __name__, meta_tags=[{"name": "viewport", "content": "width=device-width"}], compress=True
 )
+# The Flask app behind the dashboard. Point a pre-fork WSGI server at this to serve the dashboard with several worker
+# processes, e.g. gunicorn --workers 4 collaborator.dashboard:server
+server = app.server
+
+# Shared between every worker process, so adding workers doesn't multiply the calls to Spotify and Songkick.
+cache = SharedCache()
+# Each playlist's history is stored in a directory named after its ID in here, next to the cache.
+HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(cache.path)), "history")
 
 app.layout = html.Div(
     className="row",
@@ -47,11 +92,19 @@ app.layout = html.Div(
                             value="spotify:playlist:1cIYJbMgyTsEfHtPVxWETv",
                             type='text'
                         ),
-                        html.Label("Songkick location ID"),
+                        html.Label("Songkick location IDs (comma separated)"),
                         dcc.Input(
                             id="user-location",
                             value="24426",
-                            type="number"
+                            type="text"
+                        ),
+                        html.Label("Group genres by"),
+                        dcc.RadioItems(
+                            id="genre-level",
+                            options=[
+                                {"label": GENRE_LEVEL_NAMES[level], "value": level} for level in ROLLUP_LEVELS
+                            ],
+                            value="parent",
                         ),
                     ],
                 ),
@@ -69,10 +122,15 @@ app.layout = html.Div(
                 dcc.Graph(
                     id="artist-tracks-graph",
                 ),
+                dcc.Graph(
+                    id="history-graph",
+                ),
                 html.Div(
                     id="hidden-event-info",
                     style={"display": "none"}
                 ),
+                # The ETags of the figures currently shown, so unchanged figures don't need to be sent again.
+                dcc.Store(id="figure-etags"),
                 dash_table.DataTable(
                     id="events-table",
                     style_table={"overflowY": "scroll"},
@@ -89,13 +147,22 @@ app.layout = html.Div(
 
 
 @app.callback(Output("hidden-event-info", "children"), [Input("user-location", "value")])
-def update_event_location(location: str):
+def update_event_location(locations: str):
     """
-    Get all the upcoming gigs in the location provided. Store all this info as a JSON encoded string so that we don't
+    Get all the upcoming gigs in the locations provided. Store all this info as a JSON encoded string so that we don't
     need to re-query event info if the playlist is updated.
-    :param location: The songkick metro area ID.
+    :param locations: A comma separated string of songkick metro area IDs.
     """
-    events = get_events_for_location(location_id=location)
+    # The input is None once it's been cleared.
+    location_ids = sorted(location.strip() for location in (locations or "").split(",") if location.strip())
+    if not location_ids:
+        return json.dumps([])
+    # Calendars change through the day, but the dates they cover only change at midnight.
+    events = cache.get_or_set(
+        "events:{}:{}".format(",".join(location_ids), date.today().isoformat()),
+        lambda: list(get_events_for_locations(location_ids=location_ids)),
+        ttl=EVENT_CACHE_TTL,
+    )
     return json.dumps(events)
 
 
@@ -104,25 +171,144 @@ def update_event_location(location: str):
      Output("user-tracks-graph", "figure"),
      Output("genre-tracks-graph", "figure"),
      Output("artist-tracks-graph", "figure"),
+     Output("history-graph", "figure"),
+     Output("figure-etags", "data"),
      Output("events-table", "columns"),
      Output("events-table", "data")],
     [Input("playlist-uri", "value"),
-     Input("hidden-event-info", "children")])
-def update_playlist(playlist_uri: str, event_json: str):
+     Input("hidden-event-info", "children"),
+     Input("genre-level", "value")],
+    [State("figure-etags", "data")])
+def update_playlist(playlist_uri: str, event_json: str, genre_level: str, figure_etags: dict):
     """
     Update everything that depends on the content of the playlist.
     :param playlist_uri: The URI of the playlist to use.
+    :param event_json: The JSON encoded list of upcoming events.
+    :param genre_level: The level to roll genres up to, one of genres.ROLLUP_LEVELS.
+    :param figure_etags: The ETags of the figures the browser is already showing, keyed by graph.
     """
-    playlist = SpotifyPlaylist(playlist_uri=playlist_uri, spotify_connection=sp)
+    playlist = get_playlist(playlist_uri)
     events = json.loads(event_json)
     event_table = create_events_table(playlist=playlist, event_list=events)
     columns = [{"name": header, "id": header} for header in event_table[0]]
-    return playlist.name, \
-        plot_sorted_tracks(playlist.tracks_by_user, title="Tracks added over time by each user"), \
-        plot_sorted_tracks(playlist.tracks_by_genre, title="Number of tracks in different genres"), \
-        plot_sorted_tracks(playlist.tracks_by_artist, title="Number of tracks by different artists"), \
-        columns, \
-        event_table
+
+    # Like a 304, don't send figures the browser already has.
+    figure_etags = figure_etags or dict()
+    figures = []
+    new_figure_etags = dict()
+    graph_groupings = {
+        "user-tracks-graph": "tracks_by_user",
+        "genre-tracks-graph": GENRE_GROUPING_PREFIX + genre_level,
+        "artist-tracks-graph": "tracks_by_artist",
+        "history-graph": HISTORY_GROUPING,
+    }
+    for graph, grouping in graph_groupings.items():
+        new_figure_etags[graph] = figure_etag(playlist, grouping)
+        if figure_etags.get(graph) == new_figure_etags[graph]:
+            figures.append(dash.no_update)
+        else:
+            figures.append(get_figure(playlist, grouping))
+
+    return (playlist.name, *figures, new_figure_etags, columns, event_table)
+
+
+@server.route("/figures/<grouping>")
+def serve_figure(grouping: str) -> flask.Response:
+    """
+    Serve a figure as JSON with an ETag, so browsers and other clients that already have the latest version of a figure
+    get a 304 rather than downloading it again. Takes the playlist URI as the "playlist" query parameter.
+    :param grouping: The grouping of the tracks to plot, one of FIGURE_TITLES.
+    """
+    playlist_uri = flask.request.args.get("playlist")
+    if grouping not in FIGURE_TITLES or not playlist_uri:
+        flask.abort(404)
+
+    playlist = get_playlist(playlist_uri)
+    response = flask.Response(json.dumps(get_figure(playlist, grouping)), mimetype="application/json")
+    response.set_etag(figure_etag(playlist, grouping))
+    # Let the browser keep the figure, but check it's still up to date before using it.
+    response.cache_control.no_cache = True
+
+    return response.make_conditional(flask.request)
+
+
+def get_playlist(playlist_uri: str) -> SpotifyPlaylist:
+    """
+    Get a playlist from the cache, getting it from Spotify if it isn't there. The playlist includes the info for all
+    its artists, so they're cached along with it.
+    :param playlist_uri: The URI of the playlist.
+    :return: The SpotifyPlaylist.
+    """
+    return cache.get_or_set(
+        "playlist:{}".format(playlist_uri),
+        lambda: fetch_playlist(playlist_uri),
+        ttl=PLAYLIST_CACHE_TTL,
+        lock_timeout=PLAYLIST_FETCH_TIMEOUT,
+    )
+
+
+def fetch_playlist(playlist_uri: str) -> SpotifyPlaylist:
+    """
+    Get a playlist from Spotify and record a snapshot of it in its history. Only one worker fetches a playlist at a
+    time, so only one writes to its history at a time.
+    :param playlist_uri: The URI of the playlist.
+    :return: The SpotifyPlaylist.
+    """
+    playlist = SpotifyPlaylist(playlist_uri=playlist_uri, spotify_connection=get_spotify_connection())
+    get_history(playlist).record_snapshot(playlist)
+    return playlist
+
+
+def get_history(playlist: SpotifyPlaylist) -> PlaylistHistory:
+    """
+    Open the recorded history of a playlist.
+    :param playlist: The SpotifyPlaylist.
+    :return: The PlaylistHistory.
+    """
+    # Use the ID Spotify gave the playlist rather than the URI typed in, so it's always a safe directory name.
+    return PlaylistHistory(os.path.join(HISTORY_DIR, playlist.id))
+
+
+def figure_etag(playlist: SpotifyPlaylist, grouping: str) -> str:
+    """
+    Get the ETag for a figure. This changes when the playlist does, and every FIGURE_CACHE_TTL seconds so the point
+    figures have for the time they were built stays close to now.
+    :param playlist: The SpotifyPlaylist plotted by the figure.
+    :param grouping: The grouping of the tracks the figure plots, one of FIGURE_TITLES.
+    :return: The ETag as a string.
+    """
+    build_period = int(time.time() // FIGURE_CACHE_TTL)
+    return hashlib.sha1(
+        "{}:{}:{}:{}".format(playlist.playlist_uri, playlist.snapshot_id, grouping, build_period).encode()
+    ).hexdigest()
+
+
+def get_figure(playlist: SpotifyPlaylist, grouping: str) -> dict:
+    """
+    Get the figure plotting one of the playlist's groupings of tracks from the cache, building it if it isn't there.
+    :param playlist: The SpotifyPlaylist to plot.
+    :param grouping: The playlist attribute holding the tracks to plot, e.g. "tracks_by_user", GENRE_GROUPING_PREFIX
+                     followed by a genre rollup level, or HISTORY_GROUPING to plot the playlist's recorded history.
+    :return: A dictionary that can be used as the figure for a dcc.Graph.
+    """
+    if grouping == HISTORY_GROUPING:
+        # The history only changes when a snapshot of a changed playlist is recorded, so this is cached by snapshot
+        # like the other figures.
+        def build_figure():
+            return plot_history(get_history(playlist), title=FIGURE_TITLES[grouping])
+    else:
+        if grouping.startswith(GENRE_GROUPING_PREFIX):
+            # Rollups are built when the playlist is sorted, so switching level doesn't go back to the tracks.
+            tracks = playlist.genre_rollups[grouping[len(GENRE_GROUPING_PREFIX):]]
+        else:
+            tracks = getattr(playlist, grouping)
+
+        def build_figure():
+            return plot_sorted_tracks(tracks, title=FIGURE_TITLES[grouping])
+
+    return cache.get_or_set(
+        "figure:{}".format(figure_etag(playlist, grouping)), build_figure, ttl=FIGURE_CACHE_TTL
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,151 @@
+from typing import TYPE_CHECKING, Dict, Iterable, List
+
+if TYPE_CHECKING:
+    from collaborator.playlist import SpotifyPlaylistTrack
+
+# The levels genres can be rolled up to, from most to least specific. "genre" is Spotify's own micro-genre (e.g.
+# "welsh indie"), "parent" is the broad genre it's a kind of (e.g. "indie") and "family" groups related parents (e.g.
+# "rock").
+ROLLUP_LEVELS = ("genre", "parent", "family")
+
+# The genre used for anything that doesn't match a parent genre.
+OTHER_GENRE = "other"
+
+# Broad genres that micro-genres are rolled up to. Multi-word genres are matched as a whole, so "uk hip hop" rolls up
+# to "hip hop" rather than "hop".
+PARENT_GENRES = {
+    "alternative", "ambient", "americana", "bluegrass", "blues", "classical", "country", "dance", "disco",
+    "drum and bass", "dub", "dubstep", "edm", "electro", "electronic", "electronica", "emo", "folk", "funk", "garage",
+    "gospel", "grime", "grunge", "hardcore", "hip hop", "house", "indie", "jazz", "latin", "lo-fi", "metal",
+    "new wave", "pop", "post-punk", "punk", "r&b", "rap", "reggae", "rock", "ska", "soul", "soundtrack", "techno",
+    "trance", "trap", "world",
+}
+
+# The family each parent genre belongs to. Parents that aren't listed are their own family.
+GENRE_FAMILIES = {
+    "alternative": "rock",
+    "emo": "rock",
+    "grunge": "rock",
+    "hardcore": "rock",
+    "indie": "rock",
+    "metal": "rock",
+    "new wave": "rock",
+    "post-punk": "rock",
+    "punk": "rock",
+    "ambient": "electronic",
+    "dance": "electronic",
+    "drum and bass": "electronic",
+    "dubstep": "electronic",
+    "edm": "electronic",
+    "electro": "electronic",
+    "electronica": "electronic",
+    "garage": "electronic",
+    "house": "electronic",
+    "techno": "electronic",
+    "trance": "electronic",
+    "grime": "hip hop",
+    "rap": "hip hop",
+    "trap": "hip hop",
+    "disco": "r&b",
+    "funk": "r&b",
+    "gospel": "r&b",
+    "soul": "r&b",
+    "americana": "country",
+    "bluegrass": "country",
+    "dub": "reggae",
+    "ska": "reggae",
+}
+
+
+class GenreTaxonomy(object):
+    def __init__(self, overrides: Dict[str, str] = None, families: Dict[str, str] = None):
+        """
+        Maps Spotify's micro-genres to broader genres. A micro-genre's parent is found by, in order:
+            - Looking it up in overrides.
+            - Using it as is if it's already a parent genre.
+            - The longest run of words at the end of it that's a parent genre ("welsh indie" -> "indie",
+              "indie rock" -> "rock").
+            - The longest run of words anywhere in it that's a parent genre ("rock en espanol" -> "rock").
+        Anything else has a parent of OTHER_GENRE. Parents are then grouped into families.
+
+        :param overrides: A dictionary of parent genres keyed by micro-genre, for micro-genres the rules get wrong.
+        :param families: A dictionary of families keyed by parent genre, used in place of GENRE_FAMILIES.
+        """
+        self.overrides = overrides or dict()
+        self.families = GENRE_FAMILIES if families is None else families
+        # Genres already looked up, keyed by level then genre.
+        self._lookups = {level: dict() for level in ROLLUP_LEVELS}
+
+    def rollup_genre(self, genre: str, level: str) -> str:
+        """
+        Get the genre a micro-genre rolls up to at a level.
+        :param genre: The Spotify micro-genre, e.g. "welsh indie".
+        :param level: One of ROLLUP_LEVELS.
+        :return: The genre at that level, e.g. "indie" for "parent" or "rock" for "family".
+        """
+        if genre not in self._lookups[level]:
+            if level == "genre":
+                rolled_up = genre
+            elif level == "parent":
+                rolled_up = self._parent(genre)
+            elif level == "family":
+                parent = self.rollup_genre(genre, "parent")
+                rolled_up = self.families.get(parent, parent)
+            else:
+                raise ValueError("Unknown genre level {}, use one of {}".format(level, ROLLUP_LEVELS))
+            self._lookups[level][genre] = rolled_up
+
+        return self._lookups[level][genre]
+
+    def rollup(
+        self, tracks_by_genre: Dict[str, List["SpotifyPlaylistTrack"]], level: str
+    ) -> Dict[str, List["SpotifyPlaylistTrack"]]:
+        """
+        Group tracks by the genre their micro-genres roll up to at a level.
+        :param tracks_by_genre: A dictionary where keys are micro-genres and the values are a time sorted list of the
+                                tracks in that genre, e.g. SpotifyPlaylist.tracks_by_genre.
+        :param level: One of ROLLUP_LEVELS.
+        :return: A dictionary in the same format as tracks_by_genre with keys at the requested level. A track in
+                 several micro-genres that roll up to the same genre is only included once.
+        """
+        grouped_genres = dict()
+        for genre in tracks_by_genre:
+            grouped_genres.setdefault(self.rollup_genre(genre, level), []).append(genre)
+
+        rollup = dict()
+        for rolled_up, genres in grouped_genres.items():
+            if len(genres) == 1:
+                rollup[rolled_up] = list(tracks_by_genre[genres[0]])
+                continue
+            tracks = {id(track): track for genre in genres for track in tracks_by_genre[genre]}
+            rollup[rolled_up] = sorted(tracks.values(), key=lambda x: x.added_at)
+
+        return rollup
+
+    def rollup_genres(self, genres: Iterable[str], level: str) -> set:
+        """
+        Get the set of genres a collection of micro-genres roll up to at a level.
+        :param genres: Spotify micro-genres.
+        :param level: One of ROLLUP_LEVELS.
+        :return: A set of the genres at that level.
+        """
+        return {self.rollup_genre(genre, level) for genre in genres}
+
+    def _parent(self, genre: str) -> str:
+        if genre in self.overrides:
+            return self.overrides[genre]
+
+        words = genre.split()
+        # Longest suffix first.
+        for first_word in range(len(words)):
+            suffix = " ".join(words[first_word:])
+            if suffix in PARENT_GENRES:
+                return suffix
+        # Then the longest run of words anywhere.
+        for length in range(len(words) - 1, 0, -1):
+            for first_word in range(len(words) - length + 1):
+                words_run = " ".join(words[first_word : first_word + length])
+                if words_run in PARENT_GENRES:
+                    return words_run
+
+        return OTHER_GENRE
@@ -1,11 +1,16 @@
-from collaborator.playlist import SpotifyPlaylistTrack, SpotifyPlaylist
 from collaborator.live_shows import SongkickEvent
-from typing import List, Dict
-from datetime import datetime
+from collaborator.history import PlaylistHistory
+from collaborator.time_utils import parse_timestamps
+from typing import TYPE_CHECKING, Dict, Iterable, List
+from datetime import datetime, timezone
+
+if TYPE_CHECKING:
+    # Only needed for type hints. Importing the playlist pulls in spotipy which is slow, so don't do it at runtime.
+    from collaborator.playlist import SpotifyPlaylistTrack, SpotifyPlaylist
 
 
 def produce_track_time_series(
-    tracklist: List[SpotifyPlaylistTrack], name: str = ""
+    tracklist: List["SpotifyPlaylistTrack"], name: str = ""
 ) -> dict:
     """
     Create a dictionary from which plotly can use as a data series from a list of
@@ -14,8 +19,9 @@ def produce_track_time_series(
     :param tracklist: List of SpotifyPlaylistTrack objects.
     :param name: Optional name for this data set. Will be used as the name for the
                  series if provided.
-    :return: A dictionary where x is a list of datetime objects and y is the number
-             of tracks added_at that time or earlier.
+    :return: A dictionary where x is a list of times in milliseconds since the epoch and y
+             is the number of tracks added_at that time or earlier. Numbers are much
+             more compact than ISO strings, use a date x axis to display them as dates.
     """
     plot_dict = {
         "x": [],
@@ -28,35 +34,37 @@ def produce_track_time_series(
     # list.
     tracklist.sort(key=lambda x: x.added_at)
 
-    row_index = 0
     track_count = 0
     for track in tracklist:
         track_count += 1
-        time = track.added_at.isoformat()
-        # If we have an empty table we need to add a row.
-        if row_index == 0:
-            plot_dict["x"].append(time)
-            plot_dict["y"].append(track_count)
-            continue
+        time = epoch_milliseconds(track.added_at)
         # If there are two tracks with the same time stamp, then increase the count for
         # that time.
-        if plot_dict["x"][row_index] != time:
+        if plot_dict["x"] and plot_dict["x"][-1] == time:
+            plot_dict["y"][-1] = track_count
+        else:
             plot_dict["x"].append(time)
             plot_dict["y"].append(track_count)
-            row_index += 1
-        else:
-            plot_dict["y"][row_index] += 1
 
     # Need to plot a point for now So graphs that haven't updated for a while don't just stop.
-    time = datetime.now()
-    plot_dict["x"].append(time.isoformat())
+    plot_dict["x"].append(epoch_milliseconds(datetime.now(timezone.utc)))
     plot_dict["y"].append(track_count)
 
     return plot_dict
 
 
+def epoch_milliseconds(time: datetime) -> int:
+    """
+    Convert a datetime to the number of milliseconds since the epoch, which plotly
+    displays as a UTC date on a date axis.
+    :param time: A datetime. Naive datetimes are assumed to be in local time.
+    :return: The number of milliseconds since the epoch as an integer.
+    """
+    return int(time.timestamp() * 1000)
+
+
 def plot_sorted_tracks(
-    track_dict: Dict[str, List[SpotifyPlaylistTrack]], title: str = ""
+    track_dict: Dict[str, List["SpotifyPlaylistTrack"]], title: str = ""
 ) -> dict:
     """
     Create a plotly line graph showing the track count over time for various series.
@@ -77,6 +85,74 @@ def plot_sorted_tracks(
             "title": title,
             "paper_bgcolor": "#1a1c23",
             "plot_bgcolor": "rgb(34,37,43)",
+            # x values are milliseconds since the epoch, so tell plotly they're dates.
+            "xaxis": {"type": "date"},
+        }
+    }
+
+    return figure_dict
+
+
+def produce_history_time_series(
+    history: PlaylistHistory, user_uri: str = "", name: str = ""
+) -> dict:
+    """
+    Create a dictionary from which plotly can use as a data series from a playlist's recorded history. Unlike
+    produce_track_time_series this includes tracks that have since been removed from the playlist, so the count can go
+    down as well as up.
+
+    :param history: The PlaylistHistory to plot.
+    :param user_uri: Only plot tracks added by this user. Plots every track if not provided.
+    :param name: Optional name for this data set. Will be used as the name for the
+                 series if provided.
+    :return: A dictionary where x is a list of times in milliseconds since the epoch and y
+             is the number of tracks on the playlist at that time.
+    """
+    plot_dict = {
+        "x": [],
+        "y": [],
+        "name": name,
+        "type": "scatter",
+    }
+
+    track_count = 0
+    for time, track_count in history.track_count_over_time(user_uri=user_uri):
+        plot_dict["x"].append(epoch_milliseconds(time))
+        plot_dict["y"].append(track_count)
+
+    # Need to plot a point for now So graphs that haven't updated for a while don't just stop.
+    plot_dict["x"].append(epoch_milliseconds(datetime.now(timezone.utc)))
+    plot_dict["y"].append(track_count)
+
+    return plot_dict
+
+
+def plot_history(
+    history: PlaylistHistory, user_names: Dict[str, str] = None, title: str = ""
+) -> dict:
+    """
+    Create a plotly line graph showing the track count over time for each user that has ever added to the playlist,
+    including tracks that have since been removed.
+    :param history: The PlaylistHistory to plot.
+    :param user_names: Optional dictionary of names to use for each series, keyed by user uri. Series are named by user
+                       uri otherwise.
+    :param title: The title for the graph as a string.
+    :return: A dictionary that can be used to create a graph using plotly.io.show().
+    """
+    user_names = user_names or dict()
+    series = [
+        produce_history_time_series(history, user_uri=user_uri, name=user_names.get(user_uri, user_uri))
+        for user_uri in history.user_uris
+    ]
+
+    figure_dict = {
+        "data": series,
+        "layout": {
+            "title": title,
+            "paper_bgcolor": "#1a1c23",
+            "plot_bgcolor": "rgb(34,37,43)",
+            # x values are milliseconds since the epoch, so tell plotly they're dates.
+            "xaxis": {"type": "date"},
         }
     }
 
@@ -84,13 +160,15 @@ def plot_sorted_tracks(
 
 
 def create_events_table(
-    event_list: List[dict],
-    playlist: SpotifyPlaylist
+    event_list: Iterable[dict],
+    playlist: "SpotifyPlaylist"
 ) -> List[dict]:
     """
     Create a dictionary that can be used as a DashTable data input. Data will be events from event_list at which an
     artist from the playlist is performing.
-    :param event_list: A list of dictionaries each representing an event object received from the songkick API.
+    :param event_list: An iterable of dictionaries each representing an event object received from the songkick API.
+                       This can be a generator (e.g. from live_shows.get_events_for_locations) so that events are
+                       matched as they arrive.
     :param playlist: A SpotifyPlaylist.
     :return: A dictionary of the following format, note each list is sorted by date, earliest first:
                 'name': A list of the names of the events as strings.
@@ -100,22 +178,38 @@ def create_events_table(
                 'status': A list of the status of the events (e.g. whether they're cancelled).
                 'link': A list of links to the songkick event for the events.
     """
-    event_table = []
-
+    # Only the artists are needed to find the events we're interested in, so don't do anything else with the rest.
+    matched_events = []
     for event in event_list:
         sk_event = SongkickEvent(event)
         for artist in sk_event.artists:
             if playlist.is_artist_in_playlist(artist):
-                event_table.append({
-                    "name": sk_event.display_name,
-                    "venue": sk_event.venue,
-                    "artist": ", ".join(sk_event.artists),
-                    "date": sk_event.start.strftime("%d %b %Y"),
-                    "status": sk_event.status,
-                    "link": sk_event.uri
-                })
+                matched_events.append(sk_event)
                 break
 
+    # Events from different locations arrive in the order their calendars were fetched, so put them back in date
+    # order. Sort on the songkick date string as only some events have a time zone aware start time.
+    matched_events.sort(key=lambda x: x.event_json["start"]["date"])
+
+    # Parse the start times in one go, and only format each distinct one once.
+    start_strings = [sk_event.start_string for sk_event in matched_events]
+    formatted_dates = dict()
+    for start_string, start in zip(start_strings, parse_timestamps(start_strings)):
+        if start_string not in formatted_dates:
+            formatted_dates[start_string] = start.strftime("%d %b %Y")
+
+    event_table = [
+        {
+            "name": sk_event.display_name,
+            "venue": sk_event.venue,
+            "artist": ", ".join(sk_event.artists),
+            "date": formatted_dates[start_string],
+            "status": sk_event.status,
+            "link": sk_event.uri
+        }
+        for sk_event, start_string in zip(matched_events, start_strings)
+    ]
+
     if not event_table:
         event_table = [{
             "name": None,
@@ -1,39 +1,44 @@
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-from collaborator.playlist import SpotifyPlaylist, SpotifyArtist, SpotifyPlaylistTrack
-from collaborator.graph_utils import plot_sorted_tracks, create_events_table
-from collaborator.live_shows import search_songkick_locations, get_events_for_location
-import json
-from datetime import datetime, timedelta
-
-client_credentials_manager = SpotifyClientCredentials()
-sp = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
-PLAYLIST_URI = "spotify:playlist:1cIYJbMgyTsEfHtPVxWETv"
-
-
-ddm = SpotifyPlaylist(playlist_uri=PLAYLIST_URI, spotify_connection=sp)
+from collaborator.playlist import SpotifyPlaylist
+from collaborator.graph_utils import create_events_table
+from collaborator.live_shows import search_songkick_locations, get_events_for_locations
+from collaborator.spotipy_utils import get_spotify_connection
 
-metro_area = ""
-location_results = search_songkick_locations("London")
-for location in location_results:
-    if location["city"]["country"]["displayName"] == "UK":
-        metro_area = location["metroArea"]["id"]
-        break
+PLAYLIST_URI = "spotify:playlist:1cIYJbMgyTsEfHtPVxWETv"
 
-print(metro_area)
 
-events = get_events_for_location(location_id=metro_area)
+def print_playlist_summary(
+    playlist_uri: str = PLAYLIST_URI, location_name: str = "London", country: str = "UK"
+):
+    """
+    Print some stats about a playlist, along with the upcoming gigs by artists on it in a location.
+    :param playlist_uri: The spotify uri for the playlist in the format spotify:playlist:<playlist_id>.
+    :param location_name: The name of the location to search for gigs in.
+    :param country: Only search for gigs in the metro areas matching location_name in this country.
+    """
+    ddm = SpotifyPlaylist(playlist_uri=playlist_uri, spotify_connection=get_spotify_connection())
+
+    metro_areas = []
+    location_results = search_songkick_locations(location_name)
+    for location in location_results:
+        if location["city"]["country"]["displayName"] == country:
+            metro_areas.append(location["metroArea"]["id"])
+
+    print(metro_areas)
+
+    events = get_events_for_locations(location_ids=metro_areas)
+
+    event_table = create_events_table(playlist=ddm, event_list=events)
+    print(event_table)
+
+    print("There are {} songs in the playlist".format(len(ddm.tracks)))
+    print("There are {} artists in the playlist".format(len(ddm.tracks_by_artist)))
+    print(
+        "The most popular artist is {}, with {} songs".format(
+            ddm.artists[ddm.most_used_artist.uri].name,
+            len(ddm.tracks_by_artist[ddm.most_used_artist.uri]),
+        )
+    )
 
-events = json.dumps(events)
-events = json.loads(events)
-event_table = create_events_table(playlist=ddm, event_list=events)
-print(event_table)
 
-print("There are {} songs in the playlist".format(len(ddm.tracks)))
-print("There are {} artists in the playlist".format(len(ddm.tracks_by_artist)))
-print(
-    "The most popular artist is {}, with {} songs".format(
-        ddm.artists[ddm.most_used_artist.uri].name,
-        len(ddm.tracks_by_artist[ddm.most_used_artist.uri]),
-    )
-)
+if __name__ == "__main__":
+    print_playlist_summary()
@@ -0,0 +1,256 @@
+import mmap
+import os
+from array import array
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Songkick and Spotify both work in seconds, so that's as fine grained as history gets.
+SECONDS_PER_WEEK = 7 * 24 * 60 * 60
+# The epoch was a Thursday, the first Monday after it was 4 days later. Weeks start on a Monday.
+FIRST_MONDAY_OFFSET = 4 * 24 * 60 * 60
+
+ADD = 1
+REMOVE = -1
+
+
+class PlaylistHistory(object):
+    # Each column is stored in its own file as a flat array of fixed width values, so it can be memory mapped and
+    # read without any parsing. The values are the array type codes for each column.
+    columns = {
+        # When the change happened as seconds since the epoch. For adds this is when the track was added to the
+        # playlist, for removes it's when the snapshot that noticed the track had gone was observed.
+        "time": "q",
+        # When the track that was added or removed was added to the playlist as seconds since the epoch.
+        "added_at": "q",
+        # Index of the track uri in tracks.txt.
+        "track": "I",
+        # Index of the uri of the user who added the track in users.txt.
+        "user": "I",
+        # ADD or REMOVE.
+        "op": "b",
+    }
+
+    def __init__(self, history_dir: str):
+        """
+        An append-only store of the changes made to a playlist over time. Each time a snapshot of the playlist is
+        recorded, the tracks that have been added or removed since the last snapshot are appended to a set of
+        columnar files in history_dir. Reads memory map these files as numpy arrays, so queries over the whole history
+        don't need to replay any JSON or loop over the changes in Python.
+
+        :param history_dir: The directory to store the history in. Use one directory per playlist. It will be created
+                            if it doesn't already exist.
+        """
+        self.history_dir = history_dir
+        os.makedirs(self.history_dir, exist_ok=True)
+
+        # String tables mapping the integer ids stored in the columns to uris. Both are append-only.
+        self.track_uris = self._read_string_table("tracks.txt")
+        self.user_uris = self._read_string_table("users.txt")
+        self._track_ids = {uri: index for index, uri in enumerate(self.track_uris)}
+        self._user_ids = {uri: index for index, uri in enumerate(self.user_uris)}
+
+        self._truncate_to_complete_rows()
+
+        # The (track id, time added, user id) of every track on the playlist as of the latest snapshot.
+        self.current_tracks = set()
+        columns = self._read_column_arrays()
+        for added_at, track, user, op in zip(
+            columns["added_at"].tolist(), columns["track"].tolist(), columns["user"].tolist(), columns["op"].tolist()
+        ):
+            if op == ADD:
+                self.current_tracks.add((track, added_at, user))
+            else:
+                self.current_tracks.discard((track, added_at, user))
+
+    def record_snapshot(self, playlist, observed_at: datetime = None) -> Tuple[int, int]:
+        """
+        Record the current state of a playlist, appending whatever has changed since the last recorded snapshot.
+
+        :param playlist: A SpotifyPlaylist with its track info retrieved.
+        :param observed_at: When the playlist was observed in this state. Defaults to now.
+        :return: A tuple of the number of tracks added and the number of tracks removed by this snapshot.
+        """
+        if not observed_at:
+            observed_at = datetime.now(timezone.utc)
+        observed = int(observed_at.timestamp())
+
+        # A write to this store could have been interrupted since it was opened.
+        self._truncate_to_complete_rows()
+
+        snapshot = set()
+        for track in playlist.tracks:
+            snapshot.add(
+                (
+                    self._intern(track.uri, self.track_uris, self._track_ids, "tracks.txt"),
+                    int(track.added_at.timestamp()),
+                    self._intern(track.added_by.uri, self.user_uris, self._user_ids, "users.txt"),
+                )
+            )
+
+        added = sorted(snapshot - self.current_tracks, key=lambda x: x[1])
+        removed = sorted(self.current_tracks - snapshot)
+
+        new_columns = {name: array(typecode) for name, typecode in self.columns.items()}
+        for changes, op in ((added, ADD), (removed, REMOVE)):
+            for track, added_at, user in changes:
+                new_columns["time"].append(added_at if op == ADD else observed)
+                new_columns["added_at"].append(added_at)
+                new_columns["track"].append(track)
+                new_columns["user"].append(user)
+                new_columns["op"].append(op)
+
+        for name, values in new_columns.items():
+            with open(self._column_path(name), "ab") as column_file:
+                column_file.write(values.tobytes())
+
+        self.current_tracks = snapshot
+
+        return len(added), len(removed)
+
+    def track_count_per_user(self, on: datetime = None) -> Dict[str, int]:
+        """
+        The number of tracks each user had on the playlist at a point in time.
+
+        :param on: The datetime to count the tracks at. Defaults to now.
+        :return: A dictionary where keys are user uris and values are the number of tracks they had on the playlist.
+                 Users with no tracks at that time are left out.
+        """
+        import numpy as np
+
+        cutoff = int((on or datetime.now(timezone.utc)).timestamp())
+        columns = self._read_column_arrays()
+        before_cutoff = columns["time"] <= cutoff
+        counts = np.bincount(
+            columns["user"][before_cutoff], weights=columns["op"][before_cutoff], minlength=len(self.user_uris)
+        )
+
+        return {self.user_uris[user]: int(counts[user]) for user in np.flatnonzero(counts)}
+
+    def churn_per_week(self) -> List[Tuple[datetime, int, int]]:
+        """
+        The number of tracks added to and removed from the playlist each week.
+
+        :return: A list of tuples of (start of the week as a UTC datetime, tracks added, tracks removed), sorted by
+                 week. Weeks start on a Monday and weeks with no changes are left out.
+        """
+        import numpy as np
+
+        columns = self._read_column_arrays()
+        weeks, week_indices = np.unique(
+            (columns["time"] - FIRST_MONDAY_OFFSET) // SECONDS_PER_WEEK, return_inverse=True
+        )
+        added = np.bincount(week_indices, weights=columns["op"] == ADD, minlength=len(weeks))
+        removed = np.bincount(week_indices, weights=columns["op"] == REMOVE, minlength=len(weeks))
+
+        return [
+            (
+                datetime.fromtimestamp(week * SECONDS_PER_WEEK + FIRST_MONDAY_OFFSET, tz=timezone.utc),
+                int(week_added),
+                int(week_removed),
+            )
+            for week, week_added, week_removed in zip(weeks.tolist(), added.tolist(), removed.tolist())
+        ]
+
+    def track_count_over_time(self, user_uri: str = "") -> List[Tuple[datetime, int]]:
+        """
+        The number of tracks on the playlist after every change in its history, including removals.
+
+        :param user_uri: Only count tracks added by this user. Counts every track if not provided.
+        :return: A list of tuples of (time of the change as a UTC datetime, number of tracks), sorted by time.
+        """
+        import numpy as np
+
+        user_id = self._user_ids.get(user_uri) if user_uri else None
+        if user_uri and user_id is None:
+            return []
+
+        columns = self._read_column_arrays()
+        times = columns["time"]
+        ops = columns["op"]
+        if user_id is not None:
+            by_user = columns["user"] == user_id
+            times = times[by_user]
+            ops = ops[by_user]
+
+        order = np.argsort(times, kind="stable")
+        times = times[order]
+        track_counts = np.cumsum(ops[order], dtype=np.int64)
+        # Several changes at the same time are a single point on the graph, the count after the last of them.
+        last_at_time = np.append(times[1:] != times[:-1], True) if len(times) else np.zeros(0, dtype=bool)
+
+        return [
+            (datetime.fromtimestamp(time, tz=timezone.utc), count)
+            for time, count in zip(times[last_at_time].tolist(), track_counts[last_at_time].tolist())
+        ]
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.history_dir, "{}.col".format(name))
+
+    def _truncate_to_complete_rows(self):
+        """
+        Columns are appended to one at a time, so an interrupted write can leave some columns longer than others, or a
+        partial value on the end of one. Cut every column back to the last complete row, otherwise the next rows
+        appended would be misaligned for good.
+        """
+        sizes = dict()
+        for name, typecode in self.columns.items():
+            path = self._column_path(name)
+            sizes[name] = os.path.getsize(path) // array(typecode).itemsize if os.path.exists(path) else 0
+        rows = min(sizes.values())
+
+        for name, typecode in self.columns.items():
+            path = self._column_path(name)
+            if os.path.exists(path) and os.path.getsize(path) != rows * array(typecode).itemsize:
+                with open(path, "r+b") as column_file:
+                    column_file.truncate(rows * array(typecode).itemsize)
+
+    def _read_column_arrays(self) -> Dict[str, "np.ndarray"]:
+        """
+        Memory map every column file as a read only numpy array. Each map is closed once nothing is using its array.
+        """
+        import numpy as np
+
+        columns = dict()
+        for name, typecode in self.columns.items():
+            path = self._column_path(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            # An interrupted write could leave a partial value on the end of a column.
+            values = size // array(typecode).itemsize
+            if not values:
+                columns[name] = np.zeros(0, dtype=typecode)
+                continue
+            with open(path, "rb") as column_file:
+                column_map = mmap.mmap(column_file.fileno(), 0, access=mmap.ACCESS_READ)
+            columns[name] = np.frombuffer(column_map, dtype=typecode, count=values)
+        # It could also leave some columns longer than others, so only read complete rows.
+        rows = min(len(column) for column in columns.values())
+
+        return {name: column[:rows] for name, column in columns.items()}
+
+    def _read_string_table(self, file_name: str) -> List[str]:
+        path = os.path.join(self.history_dir, file_name)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r+") as table_file:
+            contents = table_file.read()
+            # Drop a partially written uri so the next one isn't appended onto the end of it.
+            if contents and not contents.endswith("\n"):
+                contents = contents[: contents.rfind("\n") + 1]
+                table_file.seek(0)
+                table_file.write(contents)
+                table_file.truncate()
+            return contents.splitlines()
+
+    def _intern(self, uri: str, table: List[str], ids: Dict[str, int], file_name: str) -> int:
+        """
+        Get the id for a uri, appending it to its string table if it's new.
+        """
+        if uri not in ids:
+            with open(os.path.join(self.history_dir, file_name), "a") as table_file:
+                table_file.write(uri + "\n")
+            ids[uri] = len(table)
+            table.append(uri)
+        return ids[uri]
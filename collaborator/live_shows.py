@@ -1,6 +1,9 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from math import asin, cos, radians, sin, sqrt
+from typing import Iterable, Iterator, List
 from collaborator.songkick_utils import songkick_api_key
+from collaborator.time_utils import parse_timestamp
 
 
 def search_songkick_locations(
@@ -41,6 +44,9 @@ def search_songkick_locations(
     else:
         raise RuntimeError("Must provide either a location name or lat and long.")
 
+    # Importing requests is slow, so only do it when we actually make a request.
+    import requests
+
     response = requests.get(request).json()
 
     return response["resultsPage"]["results"]["location"]
@@ -79,6 +85,8 @@ def get_events_for_location(
         )
     )
 
+    import requests
+
     response = requests.get(request).json()
     event_list = [
         event for event in response["resultsPage"]["results"]["event"]
@@ -103,37 +111,168 @@ def get_events_for_location(
     return event_list
 
 
+def get_metro_areas_near(
+    location_latitude: float, location_longitude: float, radius_km: float = 50
+) -> List[str]:
+    """
+    Find the IDs of all the songkick metro areas within a radius of a point. Songkick
+    doesn't support radius searches itself, so this searches by lat & long and filters
+    the results by their distance from the point. Raises a
+    requests.exceptions.RequestException if there was an error searching the API.
+    :param location_latitude: The latitude of the centre of the search. Use decimal
+                              degrees positive = north and east.
+    :param location_longitude: The longitude of the centre of the search. Use decimal
+                               degrees positive = north and east.
+    :param radius_km: The radius to search within in kilometres.
+    :return: A list of the unique metro area IDs as strings, ordered from nearest to
+             furthest.
+    """
+    earth_radius_km = 6371.0
+    location_results = search_songkick_locations(
+        location_latitude=str(location_latitude),
+        location_longitude=str(location_longitude),
+    )
+
+    metro_areas = []
+    for location in location_results:
+        metro_area = location["metroArea"]
+        metro_area_id = str(metro_area["id"])
+        # Songkick doesn't know where some metro areas are, so there's no way to tell if they're in range.
+        if metro_area_id in metro_areas or metro_area["lat"] is None or metro_area["lng"] is None:
+            continue
+        # Haversine distance between the search point and the centre of the metro area.
+        d_lat = radians(metro_area["lat"] - location_latitude)
+        d_long = radians(metro_area["lng"] - location_longitude)
+        a = (
+            sin(d_lat / 2) ** 2
+            + cos(radians(location_latitude))
+            * cos(radians(metro_area["lat"]))
+            * sin(d_long / 2) ** 2
+        )
+        if 2 * earth_radius_km * asin(sqrt(a)) <= radius_km:
+            metro_areas.append(metro_area_id)
+
+    return metro_areas
+
+
+def get_events_for_locations(
+    location_ids: Iterable[str],
+    start_date: datetime = None,
+    end_date: datetime = None,
+    max_workers: int = 8,
+) -> Iterator[dict]:
+    """
+    Search songkick for the event calendars of several locations at once. Each
+    location's calendar is fetched on its own thread so the total time taken is close to
+    that of the slowest location rather than the sum of them all. Events are yielded as
+    soon as their location's calendar arrives, so they can be matched against a
+    playlist while the other calendars are still being fetched. Metro areas can overlap,
+    so events are deduplicated by their songkick ID. Raises a
+    requests.exceptions.RequestException if there was an error searching the API.
+    :param location_ids: The IDs of the songkick metro areas to return events for.
+    :param start_date: A datetime.datetime object for the earliest event to search for.
+                       Defaults to now.
+    :param end_date: A datetime.datetime object for the latest event to search for.
+                     Defaults to 1 week after start_date.
+    :param max_workers: The maximum number of calendars to fetch at the same time.
+    :return: A generator of dictionaries each representing a songkick event object for
+             an event occurring in any of the locations.
+    """
+    # Don't fetch the same calendar twice if a location is requested more than once.
+    location_ids = list(dict.fromkeys(str(location_id) for location_id in location_ids))
+    if not location_ids:
+        return
+
+    seen_event_ids = set()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(location_ids))) as pool:
+        calendars = [
+            pool.submit(get_events_for_location, location_id, start_date, end_date)
+            for location_id in location_ids
+        ]
+        for calendar in as_completed(calendars):
+            for event in calendar.result():
+                if event["id"] not in seen_event_ids:
+                    seen_event_ids.add(event["id"])
+                    yield event
+
+
 class SongkickEvent(object):
-    def __init__(self, event_json: dict):
+    def __init__(self, event_json: dict, start: datetime = None):
         """
         A songkick event object. Represents an event at a venue (e.g. including all acts
-        on a night).
+        on a night). Only the artists are read up front, as they're all that's needed to
+        check whether an event is interesting. Everything else is read from the JSON when
+        it's first used.
         :param event_json: A dictionary of the JSON songkick Event object.
+        :param start: The start time of the event, if it's already been parsed from the
+                      JSON (e.g. using time_utils.parse_timestamps for a whole calendar).
+                      Parsed from the JSON when first used if not provided.
         """
         self.event_json = event_json
-        # The Songkick ID of the event
-        self.id = str(event_json["id"])
-        # The type of the event. 'Concert' or 'Festival'
-        self.type = event_json["type"]
-        # The URI of the event on Songkick
-        self.uri = event_json["uri"]
-        # A textual representation of the event
-        self.display_name = event_json["displayName"]
-        # A datetime.datetime object representing the start time for this event
-        if event_json["start"]["datetime"]:
-            self.start = datetime.strptime(
-                event_json["start"]["datetime"], "%Y-%m-%dT%H:%M:%S%z"
-            )
-        else:
-            self.start = datetime.strptime(
-                event_json["start"]["date"], "%Y-%m-%d"
-            )
+        self._start = start
         # A list of the artists performing at the event
         self.artists = [
             performance["artist"]["displayName"]
             for performance in event_json["performance"]
         ]
-        # The name of the venue hosting the event
-        self.venue = event_json["venue"]["displayName"]
-        # The status of the event. 'ok', 'cancelled' or 'postponed'
-        self.status = event_json["status"]
+
+    @property
+    def id(self) -> str:
+        """
+        The Songkick ID of the event
+        """
+        return str(self.event_json["id"])
+
+    @property
+    def type(self) -> str:
+        """
+        The type of the event. 'Concert' or 'Festival'
+        """
+        return self.event_json["type"]
+
+    @property
+    def uri(self) -> str:
+        """
+        The URI of the event on Songkick
+        """
+        return self.event_json["uri"]
+
+    @property
+    def display_name(self) -> str:
+        """
+        A textual representation of the event
+        """
+        return self.event_json["displayName"]
+
+    @property
+    def start(self) -> datetime:
+        """
+        A datetime.datetime object representing the start time for this event. Time zone
+        aware if songkick knows the time of the event, otherwise naive at midnight on the
+        date of the event.
+        """
+        if self._start is None:
+            self._start = parse_timestamp(self.start_string)
+        return self._start
+
+    @property
+    def start_string(self) -> str:
+        """
+        The start time of the event as an ISO 8601 string, or just the date if songkick
+        doesn't know the time.
+        """
+        return self.event_json["start"]["datetime"] or self.event_json["start"]["date"]
+
+    @property
+    def venue(self) -> str:
+        """
+        The name of the venue hosting the event
+        """
+        return self.event_json["venue"]["displayName"]
+
+    @property
+    def status(self) -> str:
+        """
+        The status of the event. 'ok', 'cancelled' or 'postponed'
+        """
+        return self.event_json["status"]
@@ -1,6 +1,22 @@
-import spotipy
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple, Union
+from collaborator.bitmap_index import BitmapIndex
+from collaborator.genres import ROLLUP_LEVELS, GenreTaxonomy
+from collaborator.similarity import MinHash, playlist_track_tokens
 from collaborator.spotipy_utils import get_all_paged_items
-from dateutil import parser as dateparser
+from collaborator.time_utils import parse_timestamp, parse_timestamps
+
+if TYPE_CHECKING:
+    # Only needed for type hints. Importing spotipy is slow, so don't do it at runtime.
+    import spotipy
+    from collaborator.cache import SharedCache
+
+# The audio features summarised by SpotifyPlaylist.audio_feature_aggregates.
+AUDIO_FEATURES = ("tempo", "energy", "danceability", "valence")
+# How long in seconds to cache that Spotify has no audio features for a track, as they may be added later.
+MISSING_AUDIO_FEATURES_TTL = 24 * 60 * 60
 
 
 class SpotifyPlaylist(object):
@@ -8,7 +24,8 @@ class SpotifyPlaylist(object):
         self,
         playlist_json: dict = None,
         playlist_uri: str = "",
-        spotify_connection: spotipy.Spotify = None,
+        spotify_connection: "spotipy.Spotify" = None,
+        genre_taxonomy: GenreTaxonomy = None,
     ):
         """
         A Spotify playlist. Hides all the nasty API interactions and JSON.
@@ -21,6 +38,8 @@ class SpotifyPlaylist(object):
         :param playlist_uri: The spotify uri for the playlist in the format spotify:playlist:<playlist_id>'. Not
                              required if providing playlist_json
         :param spotify_connection: A logged in connection to Spotify. Not required if using playlist_json..
+        :param genre_taxonomy: The GenreTaxonomy used to roll genres up into broader ones. Defaults to the standard
+                               rules with no overrides.
         """
         if playlist_json:
             self.playlist_uri = playlist_json["uri"]
@@ -52,6 +71,9 @@ class SpotifyPlaylist(object):
         # False the playlist is private, None the playlist status is not
         # relevant
         self.public = False
+        # The version of the playlist. Changes whenever the playlist does, so can be used to tell whether anything
+        # built from the playlist is out of date.
+        self.snapshot_id = ""
         # A list of SpotifyPlaylistTrack objects.
         self.tracks = list()
         # A sorted version of self.tracks, with the first item the first track added to the playlist and the last one
@@ -66,27 +88,51 @@ class SpotifyPlaylist(object):
         # A dictionary where keys are genre strings and the values are a time sorted list of the tracks that are by an
         # artist with that genre.
         self.tracks_by_genre = dict()
+        # How to roll micro-genres up into broader genres.
+        self.genre_taxonomy = genre_taxonomy or GenreTaxonomy()
+        # A dictionary of tracks_by_genre rolled up to each level in genres.ROLLUP_LEVELS, keyed by level. Each value is
+        # a dictionary where keys are genres at that level and values are a time sorted list of the tracks in them.
+        self.genre_rollups = dict()
+        # A dictionary of Counters of the number of tracks in each genre at each level, keyed by level.
+        self.genre_rollup_counts = dict()
         # A dict of SpotifyArtist objects indexed by URI representing each artist with music on the playlist
         # (including features).
         self.artists = dict()
+        # The lower case names of every artist in self.artists, for fast matching against other sources (e.g. gigs).
+        self.artist_names = set()
         # A dict of SpotifyUser objects indexed by URI representing each user that has added music to the playlist.
         self.users = dict()
         # The artist with the most songs on the playlist as a SpotifyArtist object.
         self.most_used_artist = None
         # The genre with the most songs on the playlist as a SpotifyArtist object.
         self.most_used_genre = ""
+        # Counters of the number of tracks on the playlist by each artist and in each genre, keyed by artist uri and
+        # genre respectively. Used to keep most_used_artist and most_used_genre up to date as tracks change.
+        self.artist_track_counts = Counter()
+        self.genre_track_counts = Counter()
+        # A BitmapIndex of the tracks for cross-filtering with query. Built the first time it's needed after the
+        # playlist changes.
+        self.bitmap_index = None
+        # A dict of the Spotify audio features for each track (tempo, energy etc.) keyed by track uri. Tracks Spotify
+        # has no features for have a value of None. Empty until get_audio_features has been run.
+        self.audio_features = dict()
+        # A MinHash sketch of the track and artist uris on the playlist, for finding similar playlists. None until
+        # build_sketches has been run.
+        self.sketch = None
+        # A dict of MinHash sketches of the track and artist uris each user has added, keyed by user uri.
+        self.user_sketches = dict()
         self.search_fields = (
-            "collaborative,description,href,id,name,owner," "public,tracks"
+            "collaborative,description,href,id,name,owner," "public,snapshot_id,tracks"
         )
         # Fields that we don't currently bother retrieving for this playlist.
-        self.not_implemented_fields = "external_urls,images,snapshot_id,type"
+        self.not_implemented_fields = "external_urls,images,type"
 
         if self.playlist_json:
             self.store_playlist_info()
         else:
             self.refresh_playlist(spotify_connection)
 
-    def refresh_playlist(self, spotify_connection: spotipy.Spotify):
+    def refresh_playlist(self, spotify_connection: "spotipy.Spotify"):
         """
         Get all the info for the playlist.
 
@@ -112,8 +158,9 @@ class SpotifyPlaylist(object):
         self.name = self.playlist_json["name"]
         self.owner = self.playlist_json["owner"]
         self.public = self.playlist_json["public"]
+        self.snapshot_id = self.playlist_json.get("snapshot_id", "")
 
-    def get_track_info(self, spotify_connection: spotipy.Spotify):
+    def get_track_info(self, spotify_connection: "spotipy.Spotify"):
         """
         Tracks are only returned in pages of 100, so this requires subsequent calls to the API.
         :param spotify_connection: A logged in connection to Spotify.
@@ -126,8 +173,10 @@ class SpotifyPlaylist(object):
             first_page=self.playlist_json["tracks"],
         )
 
-        for track in track_list:
-            self.tracks.append(SpotifyPlaylistTrack(playlist_track_json=track))
+        # Parse all the times the tracks were added in one go, rather than one track at a time.
+        added_at_list = parse_timestamps(track["added_at"] for track in track_list)
+        for track, added_at in zip(track_list, added_at_list):
+            self.tracks.append(SpotifyPlaylistTrack(playlist_track_json=track, added_at=added_at))
 
     def sort_by_track_info(self):
         """
@@ -158,22 +207,35 @@ class SpotifyPlaylist(object):
                     self.tracks_by_artist[artist["uri"]] = []
                 self.tracks_by_artist[artist["uri"]].append(track)
 
-    def get_artist_info(self, spotify_connection: spotipy.Spotify):
+    def get_artist_info(self, spotify_connection: "spotipy.Spotify"):
         """
         We only get rudimentary information about artists with track objects. Notably, this excludes genres. The API
         can get the info of 50 artists with a single API call, rather than doing this for each artist.
         :param spotify_connection: A logged in connection to Spotify.
         """
-        max_artists_per_api_call = 50
-
-        # Delete any existing artists.
+        # Delete any existing artists, and the genres that came from them.
         self.artists = dict()
+        self.artist_names = set()
+        self.tracks_by_genre = dict()
+        self.genre_track_counts = Counter()
+        self.genre_rollups = dict()
+        self.genre_rollup_counts = dict()
 
         # Get a list of the artists in the playlist.
         if not self.tracks_by_artist:
             self.sort_by_track_info()
 
         artist_uri_list = [artist_uri for artist_uri in self.tracks_by_artist]
+        self.add_artist_info(artist_uri_list, spotify_connection=spotify_connection)
+
+    def add_artist_info(self, artist_uri_list: List[str], spotify_connection: "spotipy.Spotify"):
+        """
+        Get the full artist info for a list of artists and add them to the playlist's artists.
+        :param artist_uri_list: A list of the artist uris to get the info for.
+        :param spotify_connection: A logged in connection to Spotify.
+        """
+        max_artists_per_api_call = 50
+
         artist_search_queue = list()
         # Sort the list of artists into lists that can be found in a single API search.
         for api_search_num in range(
@@ -192,8 +254,25 @@ class SpotifyPlaylist(object):
         for api_search in artist_search_queue:
             artist_json_list.extend(spotify_connection.artists(api_search)["artists"])
 
+        # If the playlist has already been sorted by artist info, the artists' tracks need moving to their genres.
+        # Note the genres they're filed under now, before the artists' info changes them.
+        refiled_tracks = dict()
+        if self.genre_rollups:
+            for artist in artist_json_list:
+                for track in self.tracks_by_artist.get(artist["uri"], ()):
+                    if id(track) not in refiled_tracks:
+                        refiled_tracks[id(track)] = (track, self._track_genres(track))
+
         for artist in artist_json_list:
             self.artists[artist["uri"]] = SpotifyArtist(artist_json=artist)
+            self.artist_names.add(artist["name"].lower())
+
+        if refiled_tracks:
+            for track, old_genres in refiled_tracks.values():
+                self._refile_track_genres(track, old_genres)
+            self._update_most_used()
+        # Genre bitmaps in the bitmap index come from the artists' genres, so it has to be rebuilt.
+        self.bitmap_index = None
 
     def sort_by_artist_info(self):
         """
@@ -220,12 +299,249 @@ class SpotifyPlaylist(object):
             self.tracks_by_genre[genre].sort(key=lambda x: x.added_at)
 
         # Pull out some interesting stats.
-        most_used_artist_uri = max(
-            self.tracks_by_artist, key=lambda x: len(set(self.tracks_by_artist[x]))
+        self.artist_track_counts = Counter(
+            {artist_uri: len(set(tracks)) for artist_uri, tracks in self.tracks_by_artist.items()}
+        )
+        self.genre_track_counts = Counter(
+            {genre: len(set(tracks)) for genre, tracks in self.tracks_by_genre.items()}
+        )
+        self._update_most_used()
+
+        # Roll the genres up now, so switching between levels doesn't need to go back to the tracks. The micro-genre
+        # level is just tracks_by_genre, so share it rather than keeping a copy up to date.
+        self.genre_rollups = {ROLLUP_LEVELS[0]: self.tracks_by_genre}
+        self.genre_rollup_counts = {ROLLUP_LEVELS[0]: self.genre_track_counts}
+        for level in ROLLUP_LEVELS[1:]:
+            self.genre_rollups[level] = self.genre_taxonomy.rollup(self.tracks_by_genre, level)
+            self.genre_rollup_counts[level] = Counter(
+                {genre: len(tracks) for genre, tracks in self.genre_rollups[level].items()}
+            )
+
+    def apply_delta(
+        self,
+        added: Iterable["SpotifyPlaylistTrack"] = (),
+        removed: Iterable["SpotifyPlaylistTrack"] = (),
+        spotify_connection: "spotipy.Spotify" = None,
+    ):
+        """
+        Update the playlist with tracks that have been added to or removed from it, without re-sorting the whole
+        playlist. Every index (tracks_by_time, tracks_by_user, tracks_by_artist, tracks_by_genre) is updated in place
+        and stays sorted by time, so adding a track costs a binary search per index rather than a full sort.
+        Requires the playlist to have been sorted first.
+
+        :param added: SpotifyPlaylistTrack objects that have been added to the playlist.
+        :param removed: SpotifyPlaylistTrack objects that have been removed from the playlist. These are matched to
+                        the tracks already on the playlist by uri, time added and the user that added them, so they
+                        don't need to be the same objects.
+        :param spotify_connection: A logged in connection to Spotify. Used to get the info for any artists that are new
+                                   to the playlist. If not provided, tracks by new artists won't be added to any genres.
+        """
+        added = list(added)
+        # Track ids in the bitmap index are positions in tracks_by_time, so it has to be rebuilt.
+        self.bitmap_index = None
+        # The artists and genres whose counts have gone up, so we only need to check them for new most used ones.
+        changed_artists = set()
+        changed_genres = set()
+        most_used_artist_uri = self.most_used_artist.uri if self.most_used_artist else None
+        most_used_reduced = False
+
+        removed_tracks = []
+        # Artists that have lost all their tracks. They're only dropped once the added tracks are in, in case any of
+        # those are by them too.
+        removed_artists = set()
+        for removed_track in removed:
+            track = _find_track(self.tracks_by_time, removed_track)
+            if track is None:
+                continue
+            removed_tracks.append(track)
+            self.tracks.remove(track)
+            _remove_track(self.tracks_by_time, track)
+
+            user = track.added_by.uri
+            _remove_track(self.tracks_by_user[user], track)
+            if not self.tracks_by_user[user]:
+                del self.tracks_by_user[user]
+                del self.users[user]
+
+            self._remove_from_genre_rollups(track)
+            for genre in self._track_genres(track):
+                _remove_track(self.tracks_by_genre[genre], track)
+                self.genre_track_counts[genre] -= 1
+                most_used_reduced |= genre == self.most_used_genre
+                if not self.tracks_by_genre[genre]:
+                    del self.tracks_by_genre[genre]
+                    del self.genre_track_counts[genre]
+
+            for artist in track.simple_artist_list:
+                _remove_track(self.tracks_by_artist[artist["uri"]], track)
+                self.artist_track_counts[artist["uri"]] -= 1
+                most_used_reduced |= artist["uri"] == most_used_artist_uri
+                if not self.tracks_by_artist[artist["uri"]]:
+                    del self.tracks_by_artist[artist["uri"]]
+                    del self.artist_track_counts[artist["uri"]]
+                    removed_artists.add(artist["uri"])
+
+        if spotify_connection:
+            new_artist_uris = list(
+                dict.fromkeys(
+                    artist["uri"]
+                    for track in added
+                    for artist in track.simple_artist_list
+                    if artist["uri"] not in self.artists
+                )
+            )
+            if new_artist_uris:
+                self.add_artist_info(new_artist_uris, spotify_connection=spotify_connection)
+
+        for track in added:
+            self.tracks.append(track)
+            _insort_track(self.tracks_by_time, track)
+
+            user = track.added_by
+            if user.uri not in self.tracks_by_user:
+                self.tracks_by_user[user.uri] = []
+                self.users[user.uri] = user
+            _insort_track(self.tracks_by_user[user.uri], track)
+
+            for artist in track.simple_artist_list:
+                _insort_track(self.tracks_by_artist.setdefault(artist["uri"], []), track)
+                self.artist_track_counts[artist["uri"]] += 1
+                changed_artists.add(artist["uri"])
+
+            for genre in self._track_genres(track):
+                _insort_track(self.tracks_by_genre.setdefault(genre, []), track)
+                self.genre_track_counts[genre] += 1
+                changed_genres.add(genre)
+            self._add_to_genre_rollups(track)
+
+        dropped_artists = [
+            artist_uri
+            for artist_uri in removed_artists
+            if artist_uri not in self.tracks_by_artist and artist_uri in self.artists
+        ]
+        if dropped_artists:
+            for artist_uri in dropped_artists:
+                del self.artists[artist_uri]
+            # Different artists can share a name, so only names no remaining artist uses can go.
+            self.artist_names = {artist.name.lower() for artist in self.artists.values()}
+
+        if self.sketch is not None:
+            # Sketches can have tracks added but not taken away, so rebuild the ones that have lost tracks.
+            removed_users = {track.added_by.uri for track in removed_tracks}
+            if removed_tracks:
+                self.sketch = MinHash(playlist_track_tokens(self.tracks_by_time))
+            else:
+                self.sketch.update(playlist_track_tokens(added))
+            for user in removed_users:
+                if user in self.tracks_by_user:
+                    self.user_sketches[user] = MinHash(playlist_track_tokens(self.tracks_by_user[user]))
+                else:
+                    del self.user_sketches[user]
+            for track in added:
+                if track.added_by.uri not in removed_users:
+                    self.user_sketches.setdefault(track.added_by.uri, MinHash()).update(
+                        playlist_track_tokens([track])
+                    )
+
+        if most_used_reduced:
+            # Anything could be the most used now, so we have to look at them all.
+            self._update_most_used()
+        else:
+            # Otherwise only the things that have gained tracks could have overtaken the current most used.
+            for artist_uri in changed_artists:
+                if artist_uri in self.artists and (
+                    self.most_used_artist is None
+                    or self.artist_track_counts[artist_uri]
+                    > self.artist_track_counts[self.most_used_artist.uri]
+                ):
+                    self.most_used_artist = self.artists[artist_uri]
+            for genre in changed_genres:
+                if not self.most_used_genre or (
+                    self.genre_track_counts[genre] > self.genre_track_counts[self.most_used_genre]
+                ):
+                    self.most_used_genre = genre
+
+    def _add_to_genre_rollups(self, track: "SpotifyPlaylistTrack"):
+        """
+        Add a track to the genre rollups above the micro-genre level, which is just tracks_by_genre.
+        """
+        genres = self._track_genres(track)
+        for level in ROLLUP_LEVELS[1:]:
+            if level not in self.genre_rollups:
+                continue
+            for genre in self.genre_taxonomy.rollup_genres(genres, level):
+                _insort_track(self.genre_rollups[level].setdefault(genre, []), track)
+                self.genre_rollup_counts[level][genre] += 1
+
+    def _remove_from_genre_rollups(self, track: "SpotifyPlaylistTrack"):
+        """
+        Remove a track from the genre rollups above the micro-genre level, which is just tracks_by_genre.
+        """
+        genres = self._track_genres(track)
+        for level in ROLLUP_LEVELS[1:]:
+            if level not in self.genre_rollups:
+                continue
+            for genre in self.genre_taxonomy.rollup_genres(genres, level):
+                _remove_track(self.genre_rollups[level][genre], track)
+                self.genre_rollup_counts[level][genre] -= 1
+                if not self.genre_rollups[level][genre]:
+                    del self.genre_rollups[level][genre]
+                    del self.genre_rollup_counts[level][genre]
+
+    def _refile_track_genres(self, track: "SpotifyPlaylistTrack", old_genres: set):
+        """
+        Move a track between genres (at every level) after the info for its artists has changed.
+        :param track: The track, already on the playlist.
+        :param old_genres: The micro-genres the track is filed under now, from _track_genres before the change.
+        """
+        new_genres = self._track_genres(track)
+        for genre in new_genres - old_genres:
+            _insort_track(self.tracks_by_genre.setdefault(genre, []), track)
+            self.genre_track_counts[genre] += 1
+        for genre in old_genres - new_genres:
+            _remove_track(self.tracks_by_genre[genre], track)
+            self.genre_track_counts[genre] -= 1
+            if not self.tracks_by_genre[genre]:
+                del self.tracks_by_genre[genre]
+                del self.genre_track_counts[genre]
+
+        for level in ROLLUP_LEVELS[1:]:
+            if level not in self.genre_rollups:
+                continue
+            old_rollups = self.genre_taxonomy.rollup_genres(old_genres, level)
+            new_rollups = self.genre_taxonomy.rollup_genres(new_genres, level)
+            for genre in new_rollups - old_rollups:
+                _insort_track(self.genre_rollups[level].setdefault(genre, []), track)
+                self.genre_rollup_counts[level][genre] += 1
+            for genre in old_rollups - new_rollups:
+                _remove_track(self.genre_rollups[level][genre], track)
+                self.genre_rollup_counts[level][genre] -= 1
+                if not self.genre_rollups[level][genre]:
+                    del self.genre_rollups[level][genre]
+                    del self.genre_rollup_counts[level][genre]
+
+    def _track_genres(self, track: "SpotifyPlaylistTrack") -> set:
+        """
+        Get the genres of all the artists on a track that we have artist info for.
+        """
+        return {
+            genre
+            for artist in track.simple_artist_list
+            if artist["uri"] in self.artists
+            for genre in self.artists[artist["uri"]].genres
+        }
+
+    def _update_most_used(self):
+        """
+        Update most_used_artist and most_used_genre from the artist and genre track counters.
+        """
+        # We may not have the info for every artist if tracks have been added without a connection to Spotify.
+        known_artists = [artist_uri for artist_uri in self.artist_track_counts if artist_uri in self.artists]
+        self.most_used_artist = (
+            self.artists[max(known_artists, key=self.artist_track_counts.get)] if known_artists else None
         )
-        self.most_used_artist = self.artists[most_used_artist_uri]
-        self.most_used_genre = max(
-            self.tracks_by_genre, key=lambda x: len(set(self.tracks_by_genre[x]))
+        self.most_used_genre = (
+            max(self.genre_track_counts, key=self.genre_track_counts.get) if self.genre_track_counts else ""
         )
 
     def sort_playlist(self):
@@ -234,6 +550,159 @@ class SpotifyPlaylist(object):
         """
         self.sort_by_track_info()
         self.sort_by_artist_info()
+        self.bitmap_index = None
+        if self.sketch is not None:
+            self.build_sketches()
+
+    def query(
+        self,
+        user: Union[str, Iterable[str]] = None,
+        artist: Union[str, Iterable[str]] = None,
+        genre: Union[str, Iterable[str]] = None,
+        added_between: Tuple[datetime, datetime] = None,
+    ) -> List["SpotifyPlaylistTrack"]:
+        """
+        Find the tracks on the playlist matching every filter given, e.g. the tracks added by a user in a genre between
+        two dates. Each of user, artist and genre can be a single value or several, in which case tracks matching any of
+        them match. Requires the playlist to have been sorted first.
+        :param user: The uri(s) of the users who added the tracks.
+        :param artist: The uri(s) of the artists on the tracks.
+        :param genre: The genre(s) of the tracks.
+        :param added_between: A tuple of the earliest and latest times the tracks were added, inclusive. Either can be
+                              None to leave that end open. Spotify times are time zone aware, so these should be too.
+        :return: A list of the matching SpotifyPlaylistTrack objects, sorted by the time they were added.
+        """
+        if self.bitmap_index is None:
+            self.bitmap_index = BitmapIndex(self.tracks_by_time, self.artists)
+
+        return self.bitmap_index.query(user=user, artist=artist, genre=genre, added_between=added_between)
+
+    def build_sketches(self):
+        """
+        Build MinHash sketches of the track and artist uris on the playlist as a whole (sketch) and for each user
+        (user_sketches). Compare sketches, or index lots of them with similarity.build_similarity_index, to find
+        similar playlists and users. Once built, apply_delta keeps them up to date. Requires the playlist to have been
+        sorted first.
+        """
+        self.sketch = MinHash(playlist_track_tokens(self.tracks_by_time))
+        self.user_sketches = {
+            user: MinHash(playlist_track_tokens(tracks)) for user, tracks in self.tracks_by_user.items()
+        }
+
+    def get_audio_features(
+        self,
+        spotify_connection: "spotipy.Spotify",
+        cache: "SharedCache" = None,
+        max_workers: int = 4,
+    ):
+        """
+        Get the audio features (tempo, energy, danceability, valence etc.) for every track on the playlist and store
+        them on the tracks. The API can get the features of 100 tracks with a single call, and the calls are made
+        concurrently. A track's features never change, so they're kept in the cache forever if one is given. Tracks
+        without features are only cached for MISSING_AUDIO_FEATURES_TTL, in case Spotify adds them later.
+        :param spotify_connection: A logged in connection to Spotify.
+        :param cache: An optional SharedCache to check before calling the API, and to store the features in.
+        :param max_workers: The maximum number of API calls to make at the same time.
+        """
+        max_tracks_per_api_call = 100
+
+        # Local files aren't on Spotify so don't have any features.
+        track_uris = list(dict.fromkeys(track.uri for track in self.tracks if not track.is_local))
+
+        if cache:
+            cached_features = cache.get_many("audio_features:{}".format(uri) for uri in track_uris)
+            for uri in track_uris:
+                if "audio_features:{}".format(uri) in cached_features:
+                    self.audio_features[uri] = cached_features["audio_features:{}".format(uri)]
+
+        missing_uris = [uri for uri in track_uris if uri not in self.audio_features]
+        api_searches = [
+            missing_uris[first_uri : first_uri + max_tracks_per_api_call]
+            for first_uri in range(0, len(missing_uris), max_tracks_per_api_call)
+        ]
+        if api_searches:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(api_searches))) as pool:
+                results = pool.map(spotify_connection.audio_features, api_searches)
+                new_features = dict()
+                for api_search, features_list in zip(api_searches, results):
+                    # Tracks Spotify doesn't have features for come back as None.
+                    new_features.update(zip(api_search, features_list))
+            self.audio_features.update(new_features)
+            if cache:
+                cache.set_many(
+                    {
+                        "audio_features:{}".format(uri): features
+                        for uri, features in new_features.items()
+                        if features is not None
+                    },
+                    ttl=None,
+                )
+                cache.set_many(
+                    {
+                        "audio_features:{}".format(uri): None
+                        for uri, features in new_features.items()
+                        if features is None
+                    },
+                    ttl=MISSING_AUDIO_FEATURES_TTL,
+                )
+
+        for track in self.tracks:
+            track.audio_features = self.audio_features.get(track.uri)
+
+    def audio_feature_aggregates(
+        self, grouping: Dict[str, List["SpotifyTrack"]] = None
+    ) -> Dict[str, Dict[str, float]]:
+        """
+        Get the mean of each audio feature in AUDIO_FEATURES for each group of tracks, e.g. per user or per genre.
+        Requires get_audio_features to have been run first. Tracks without features are ignored.
+        :param grouping: A dictionary of lists of tracks, such as tracks_by_user or tracks_by_genre. Defaults to
+                         tracks_by_user.
+        :return: A dictionary with the same keys as grouping, where values are dictionaries of the mean of each feature
+                 keyed by feature name. Features with no values for a group are NaN.
+        """
+        import numpy as np
+
+        if grouping is None:
+            grouping = self.tracks_by_user
+
+        # One row of features per track uri. Missing features are NaN so they can be masked out.
+        track_rows = {uri: row for row, uri in enumerate(self.audio_features)}
+        features = np.array(
+            [
+                [
+                    track_features[feature] if track_features else np.nan
+                    for feature in AUDIO_FEATURES
+                ]
+                for track_features in self.audio_features.values()
+            ],
+            dtype=float,
+        ).reshape(-1, len(AUDIO_FEATURES))
+
+        # Flatten the grouping into a pair of arrays with the group index and feature row of every track in it, then
+        # sum each group with bincount. This handles tracks being in several groups (e.g. genres) at once.
+        group_names = list(grouping)
+        group_indices = []
+        rows = []
+        for group_index, group_name in enumerate(group_names):
+            for track in grouping[group_name]:
+                if track.uri in track_rows:
+                    group_indices.append(group_index)
+                    rows.append(track_rows[track.uri])
+        group_indices = np.array(group_indices, dtype=int)
+        values = features[np.array(rows, dtype=int)]
+
+        has_value = ~np.isnan(values)
+        values = np.where(has_value, values, 0)
+        means = np.full((len(group_names), len(AUDIO_FEATURES)), np.nan)
+        for feature_index in range(len(AUDIO_FEATURES)):
+            sums = np.bincount(group_indices, weights=values[:, feature_index], minlength=len(group_names))
+            counts = np.bincount(group_indices, weights=has_value[:, feature_index], minlength=len(group_names))
+            np.divide(sums, counts, out=means[:, feature_index], where=counts > 0)
+
+        return {
+            group_name: dict(zip(AUDIO_FEATURES, means[group_index].tolist()))
+            for group_index, group_name in enumerate(group_names)
+        }
 
     def is_artist_in_playlist(self, artist: str) -> bool:
         """
@@ -241,14 +710,61 @@ class SpotifyPlaylist(object):
         :param artist: Artist name as a string.
         :return: True if the artist is present, False otherwise.
         """
-        artist_present = False
-        for playlist_artist in self.artists.values():
-            artist_name = playlist_artist.name.lower()
-            if artist.lower() == artist_name:
-                artist_present = True
-                break
-
-        return artist_present
+        return artist.lower() in self.artist_names
+
+
+def _bisect_by_added_at(track_list: List["SpotifyPlaylistTrack"], track: "SpotifyPlaylistTrack") -> int:
+    """
+    Find the index after the last track in a time sorted track list added at or before a track.
+    """
+    low, high = 0, len(track_list)
+    while low < high:
+        middle = (low + high) // 2
+        if track.added_at < track_list[middle].added_at:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def _insort_track(track_list: List["SpotifyPlaylistTrack"], track: "SpotifyPlaylistTrack"):
+    """
+    Insert a track into a time sorted track list, keeping it sorted.
+    """
+    track_list.insert(_bisect_by_added_at(track_list, track), track)
+
+
+def _find_track(
+    track_list: List["SpotifyPlaylistTrack"], track: "SpotifyPlaylistTrack"
+) -> "SpotifyPlaylistTrack":
+    """
+    Find the track in a time sorted track list that was added at the same time, by the same user as a track.
+    :return: The matching track from track_list or None if there isn't one.
+    """
+    index = _bisect_by_added_at(track_list, track) - 1
+    while index >= 0 and track_list[index].added_at == track.added_at:
+        candidate = track_list[index]
+        if candidate.uri == track.uri and candidate.added_by.uri == track.added_by.uri:
+            return candidate
+        index -= 1
+    return None
+
+
+def _remove_track(track_list: List["SpotifyPlaylistTrack"], track: "SpotifyPlaylistTrack"):
+    """
+    Remove a track from a time sorted track list. The track must be in the list.
+    """
+    index = _bisect_by_added_at(track_list, track) - 1
+    while index >= 0 and track_list[index].added_at == track.added_at:
+        if track_list[index] is track:
+            del track_list[index]
+            return
+        index -= 1
+    raise RuntimeError(
+        "Track {} added at {} isn't in the track list, so the playlist's indexes are out of sync".format(
+            track.uri, track.added_at
+        )
+    )
 
 
 class SpotifyTrack(object):
@@ -256,7 +772,7 @@ class SpotifyTrack(object):
         self,
         track_json: dict = None,
         track_uri: str = "",
-        spotify_connection: spotipy.Spotify = None,
+        spotify_connection: "spotipy.Spotify" = None,
     ):
         """
         A Spotify track. Hides all the nasty API interactions and JSON .
@@ -305,10 +821,13 @@ class SpotifyTrack(object):
         self.preview = self.track_json["preview_url"]
         # The Spotify URI for the track.
         self.uri = self.track_json["uri"]
+        # A dict of the Spotify audio features for the track (tempo, energy, danceability, valence etc.). None until
+        # retrieved using SpotifyPlaylist.get_audio_features, or if Spotify has no features for the track.
+        self.audio_features = None
 
 
 class SpotifyPlaylistTrack(SpotifyTrack):
-    def __init__(self, playlist_track_json: dict):
+    def __init__(self, playlist_track_json: dict, added_at: datetime = None):
         """
         A Spotify 'playlist track' object. This contains the playlist
         metadata on top of a normal track.
@@ -317,12 +836,16 @@ class SpotifyPlaylistTrack(SpotifyTrack):
                                     track' object. This can only be retrieved
                                     from a playlist as opposed to direct from
                                     the API.
+        :param added_at: The time the track was added, if it's already been
+                         parsed from the JSON (e.g. using
+                         time_utils.parse_timestamps for a whole playlist).
+                         Parsed from the JSON if not provided.
         """
         self.playlist_track_json = playlist_track_json
         super().__init__(track_json=self.playlist_track_json["track"])
 
         # The datetime object for when the track was added.
-        self.added_at = dateparser.isoparse(playlist_track_json["added_at"])
+        self.added_at = added_at or parse_timestamp(playlist_track_json["added_at"])
         # A SpotifyUser object for the user who added the track.
         self.added_by = SpotifyUser(user_json=playlist_track_json["added_by"])
         # Whether this track is a local file or not
@@ -334,7 +857,7 @@ class SpotifyUser(object):
         self,
         user_json: dict = None,
         user_uri: str = "",
-        spotify_connection: spotipy.Spotify = None,
+        spotify_connection: "spotipy.Spotify" = None,
     ):
         """
         A Spotify user. Hides all the nasty API interactions and JSON .
@@ -371,7 +894,7 @@ class SpotifyArtist(object):
         self,
         artist_json: dict = None,
         artist_uri: str = "",
-        spotify_connection: spotipy.Spotify = None,
+        spotify_connection: "spotipy.Spotify" = None,
     ):
         """
         A Spotify artist. Hides all the nasty API interactions and JSON .
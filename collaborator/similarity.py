@@ -0,0 +1,223 @@
+import hashlib
+from array import array
+from typing import TYPE_CHECKING, Dict, Hashable, Iterable, List, Set, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Hashes are permuted with 64 bit multiply-shift hashing, keeping the top 32 bits to keep sketches small.
+MAX_HASH = (1 << 32) - 1
+
+# The permutations for each (num_perm, seed), so sketches with the same settings don't each generate their own.
+_permutations = dict()
+
+
+def _get_permutations(num_perm: int, seed: int) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Get the multipliers and increments of the hash permutations, as columns of 64 bit unsigned ints.
+    """
+    import numpy as np
+
+    if (num_perm, seed) not in _permutations:
+        generator = np.random.default_rng(seed)
+        # Multipliers have to be odd so that no bits of the token hash are lost.
+        multipliers = generator.integers(0, 1 << 64, size=(num_perm, 1), dtype=np.uint64, endpoint=False) | 1
+        increments = generator.integers(0, 1 << 64, size=(num_perm, 1), dtype=np.uint64, endpoint=False)
+        _permutations[(num_perm, seed)] = (multipliers, increments)
+    return _permutations[(num_perm, seed)]
+
+
+class MinHash(object):
+    def __init__(self, tokens: Iterable[str] = (), num_perm: int = 128, seed: int = 1):
+        """
+        A MinHash sketch of a set of strings (e.g. the track and artist uris on a playlist). The fraction of values two
+        sketches share estimates the Jaccard similarity of their sets, and sketches are a fixed size however big the
+        set gets (num_perm 32 bit values). Tokens can be added at any time but can't be removed.
+
+        :param tokens: The strings to start the sketch with.
+        :param num_perm: The number of hash permutations. More gives a more accurate estimate but a bigger sketch.
+                         Only sketches with the same num_perm and seed can be compared.
+        :param seed: The seed for generating the hash permutations.
+        """
+        self.num_perm = num_perm
+        self.seed = seed
+        self.hashvalues = array("I", [MAX_HASH]) * num_perm
+        self.update(tokens)
+
+    def update(self, tokens: Iterable[str]):
+        """
+        Add strings to the sketch. Every token is hashed first, then every permutation of every hash is computed at
+        once with numpy.
+        :param tokens: The strings to add.
+        """
+        import numpy as np
+
+        token_hashes = np.frombuffer(
+            b"".join(hashlib.blake2b(token.encode(), digest_size=8).digest() for token in tokens), dtype="<u8"
+        )
+        if not len(token_hashes):
+            return
+
+        multipliers, increments = _get_permutations(self.num_perm, self.seed)
+        hashvalues = np.frombuffer(self.hashvalues, dtype=np.uint32)
+        # Permute a chunk of tokens at a time so the (num_perm, tokens) array doesn't get too big.
+        max_tokens_per_chunk = 8192
+        for first_token in range(0, len(token_hashes), max_tokens_per_chunk):
+            # Multiplying and adding wrap around modulo 2 ** 64.
+            permuted = (multipliers * token_hashes[first_token : first_token + max_tokens_per_chunk] + increments) >> 32
+            hashvalues = np.minimum(hashvalues, permuted.min(axis=1).astype(np.uint32))
+        self.hashvalues = array("I", hashvalues.tobytes())
+
+    def merge(self, other: "MinHash"):
+        """
+        Add everything in another sketch to this one, as if its tokens had been added.
+        :param other: A MinHash with the same num_perm and seed.
+        """
+        self._check_compatible(other)
+        self.hashvalues = array("I", map(min, self.hashvalues, other.hashvalues))
+
+    def jaccard(self, other: "MinHash") -> float:
+        """
+        Estimate the Jaccard similarity of the sets of tokens in this sketch and another.
+        :param other: A MinHash with the same num_perm and seed.
+        :return: The estimated similarity between 0 and 1.
+        """
+        self._check_compatible(other)
+        return sum(1 for mine, theirs in zip(self.hashvalues, other.hashvalues) if mine == theirs) / self.num_perm
+
+    def is_empty(self) -> bool:
+        """
+        :return: True if no tokens have been added to the sketch, False otherwise.
+        """
+        return all(value == MAX_HASH for value in self.hashvalues)
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialise the sketch's hash values compactly, e.g. to store alongside a cached playlist.
+        :return: The hash values as bytes. Use from_bytes with the same seed to load them again.
+        """
+        return self.hashvalues.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, seed: int = 1) -> "MinHash":
+        """
+        Load a sketch serialised with to_bytes.
+        :param data: The bytes from to_bytes.
+        :param seed: The seed the sketch was created with.
+        :return: The MinHash.
+        """
+        hashvalues = array("I")
+        hashvalues.frombytes(data)
+        sketch = cls(num_perm=len(hashvalues), seed=seed)
+        sketch.hashvalues = hashvalues
+        return sketch
+
+    def _check_compatible(self, other: "MinHash"):
+        if (self.num_perm, self.seed) != (other.num_perm, other.seed):
+            raise ValueError("Can only compare MinHash sketches with the same num_perm and seed")
+
+
+class MinHashLSH(object):
+    def __init__(self, bands: int = 32, rows: int = 4):
+        """
+        A locality sensitive hashing index of MinHash sketches, for finding similar sketches without comparing against
+        every one. Each sketch is split into bands of rows hash values, and sketches sharing every value in any band
+        are candidates. Sketches must have bands * rows permutations. Sketches with a Jaccard similarity above roughly
+        (1 / bands) ** (1 / rows) are very likely to be found, much less similar ones are unlikely to be.
+
+        :param bands: The number of bands to split each sketch into. More bands finds less similar sketches.
+        :param rows: The number of hash values in each band. More rows makes candidates more similar.
+        """
+        self.bands = bands
+        self.rows = rows
+        # A dictionary per band of the keys of the sketches in each bucket, keyed by the band's hash values.
+        self.buckets = [dict() for _ in range(bands)]
+        # The sketches in the index keyed by key.
+        self.sketches = dict()
+        # The band keys each sketch was inserted with, keyed by key. Kept separately as sketches can be updated in
+        # place after they're inserted.
+        self._inserted_band_keys = dict()
+
+    def insert(self, key: Hashable, sketch: MinHash):
+        """
+        Add a sketch to the index, replacing any sketch already stored under the key. Re-insert a sketch after
+        updating it so the index stays up to date.
+        :param key: The key to return for this sketch, e.g. a user or playlist uri.
+        :param sketch: The MinHash to add. Must have bands * rows permutations.
+        """
+        if sketch.num_perm != self.bands * self.rows:
+            raise ValueError(
+                "Sketches must have {} permutations for this index".format(self.bands * self.rows)
+            )
+        self.remove(key)
+        self.sketches[key] = sketch
+        self._inserted_band_keys[key] = self._band_keys(sketch)
+        for band, band_key in enumerate(self._inserted_band_keys[key]):
+            self.buckets[band].setdefault(band_key, set()).add(key)
+
+    def remove(self, key: Hashable):
+        """
+        Remove a sketch from the index if it's there.
+        :param key: The key the sketch was inserted with.
+        """
+        if key not in self.sketches:
+            return
+        del self.sketches[key]
+        for band, band_key in enumerate(self._inserted_band_keys.pop(key)):
+            self.buckets[band][band_key].discard(key)
+            if not self.buckets[band][band_key]:
+                del self.buckets[band][band_key]
+
+    def query(self, sketch: MinHash) -> Set[Hashable]:
+        """
+        Find the keys of the sketches in the index that are likely to be similar to a sketch.
+        :param sketch: The MinHash to find similar sketches to.
+        :return: A set of the keys of the candidate sketches.
+        """
+        candidates = set()
+        for band, band_key in enumerate(self._band_keys(sketch)):
+            candidates.update(self.buckets[band].get(band_key, ()))
+        return candidates
+
+    def most_similar(self, sketch: MinHash, top_n: int = 10) -> List[Tuple[Hashable, float]]:
+        """
+        Find the sketches in the index most similar to a sketch. Only the candidates from query are compared.
+        :param sketch: The MinHash to find similar sketches to.
+        :param top_n: The maximum number of results to return.
+        :return: A list of tuples of (key, estimated Jaccard similarity), most similar first.
+        """
+        similarities = [(key, self.sketches[key].jaccard(sketch)) for key in self.query(sketch)]
+        similarities.sort(key=lambda x: x[1], reverse=True)
+        return similarities[:top_n]
+
+    def _band_keys(self, sketch: MinHash) -> List[bytes]:
+        return [
+            sketch.hashvalues[band * self.rows : (band + 1) * self.rows].tobytes() for band in range(self.bands)
+        ]
+
+
+def playlist_track_tokens(tracks: Iterable) -> Iterable[str]:
+    """
+    Get the tokens to sketch a list of tracks by; the uri of each track and each of its artists.
+    :param tracks: SpotifyTrack objects.
+    :return: A generator of the uris.
+    """
+    for track in tracks:
+        yield track.uri
+        for artist in track.simple_artist_list:
+            yield artist["uri"]
+
+
+def build_similarity_index(sketches: Dict[Hashable, MinHash], bands: int = 32, rows: int = 4) -> MinHashLSH:
+    """
+    Build an LSH index of several sketches at once, e.g. a SpotifyPlaylist's user_sketches or the sketches of many
+    playlists keyed by playlist uri.
+    :param sketches: A dictionary of MinHash objects keyed by the key to return for them.
+    :param bands: The number of bands to split each sketch into.
+    :param rows: The number of hash values in each band.
+    :return: The MinHashLSH index.
+    """
+    index = MinHashLSH(bands=bands, rows=rows)
+    for key, sketch in sketches.items():
+        index.insert(key, sketch)
+    return index
@@ -1,5 +1,33 @@
-from typing import List
-import spotipy
+import threading
+from typing import TYPE_CHECKING, List
+
+if TYPE_CHECKING:
+    # Only needed for type hints. Importing spotipy is slow, so don't do it at runtime.
+    import spotipy
+
+# The shared connection to Spotify, created the first time it's needed.
+_spotify_connection = None
+_spotify_connection_lock = threading.Lock()
+
+
+def get_spotify_connection() -> "spotipy.Spotify":
+    """
+    Get a connection to Spotify logged in using the client credentials stored in the SPOTIPY_CLIENT_ID and
+    SPOTIPY_CLIENT_SECRET environment variables. The connection is only created the first time this is called, so
+    importing modules that use Spotify stays fast and doesn't need credentials.
+    :return: A logged in connection to Spotify.
+    """
+    global _spotify_connection
+    with _spotify_connection_lock:
+        if _spotify_connection is None:
+            import spotipy
+            from spotipy.oauth2 import SpotifyClientCredentials
+
+            _spotify_connection = spotipy.Spotify(
+                client_credentials_manager=SpotifyClientCredentials()
+            )
+
+    return _spotify_connection
 
 
 def get_items_from_page(page: dict) -> List[dict]:
@@ -20,7 +48,7 @@ def get_items_from_page(page: dict) -> List[dict]:
 
 
 def get_all_paged_items(
-    spotify_connection: spotipy.Spotify, first_page: dict
+    spotify_connection: "spotipy.Spotify", first_page: dict
 ) -> List[dict]:
     """
     Gets everything wrapped in a Spotify paging object and puts it into an array.
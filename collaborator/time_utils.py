@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List
+
+
+def parse_timestamps(timestamps: Iterable[str]) -> List[datetime]:
+    """
+    Parse a whole column of ISO 8601 timestamps at once, e.g. the added_at of every track on a playlist or the start of
+    every event in a calendar. The fixed formats used by Spotify (2020-04-01T10:00:00Z) and Songkick
+    (2020-04-01T19:30:00+0100 and 2020-04-01) are parsed by slicing, and each distinct timestamp is only parsed once, as
+    lots of tracks and events share them. Anything else falls back to dateutil.
+    :param timestamps: The timestamps to parse as strings.
+    :return: A list of datetime objects in the same order as timestamps. Timestamps with a time zone give time zone
+             aware datetimes, dates give naive datetimes at midnight.
+    """
+    parsed = dict()
+    # Time zones keyed by their offset string, so each offset only creates one time zone object.
+    time_zones = {"Z": timezone.utc}
+    results = []
+    for timestamp in timestamps:
+        if timestamp not in parsed:
+            parsed[timestamp] = _parse_fixed_format(timestamp, time_zones)
+        results.append(parsed[timestamp])
+
+    return results
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    """
+    Parse a single ISO 8601 timestamp. Use parse_timestamps to parse lots at once.
+    :param timestamp: The timestamp to parse as a string.
+    :return: The timestamp as a datetime object.
+    """
+    return parse_timestamps([timestamp])[0]
+
+
+def _parse_fixed_format(timestamp: str, time_zones: Dict[str, timezone]) -> datetime:
+    """
+    Parse a timestamp in one of the fixed formats by slicing, or with dateutil if it isn't in one.
+    """
+    try:
+        if len(timestamp) == 10 and timestamp[4] == "-" and timestamp[7] == "-":
+            return datetime(int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10]))
+
+        if len(timestamp) in (20, 24) and timestamp[10] == "T":
+            offset = timestamp[19:]
+            if offset not in time_zones:
+                if offset[0] not in "+-":
+                    raise ValueError("Unexpected time zone")
+                sign = 1 if offset[0] == "+" else -1
+                time_zones[offset] = timezone(
+                    sign * timedelta(hours=int(offset[1:3]), minutes=int(offset[3:5]))
+                )
+            return datetime(
+                int(timestamp[0:4]),
+                int(timestamp[5:7]),
+                int(timestamp[8:10]),
+                int(timestamp[11:13]),
+                int(timestamp[14:16]),
+                int(timestamp[17:19]),
+                tzinfo=time_zones[offset],
+            )
+    except ValueError:
+        pass
+
+    from dateutil import parser as dateparser
+
+    return dateparser.isoparse(timestamp)
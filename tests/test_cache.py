@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import sqlite3
+import time
+
+from collaborator.cache import SharedCache
+
+
+def slow_factory(calls_path):
+    with open(calls_path, "a") as calls_file:
+        calls_file.write("called\n")
+    time.sleep(0.5)
+    return [1, 2]
+
+
+def get_events(cache_path, calls_path, start):
+    start.wait()
+    assert SharedCache(cache_path).get_or_set("events", lambda: slow_factory(calls_path)) == [1, 2]
+
+
+def test_shared_cache(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SharedCache(path)
+    cache.set("playlist", {"name": "Duw do music"})
+    cache.set("expired", 1, ttl=-10)
+
+    # Another instance, e.g. in another worker process, sees the same values.
+    other_cache = SharedCache(path)
+    assert other_cache.get("playlist") == {"name": "Duw do music"}
+    assert other_cache.get("expired") is None
+    assert other_cache.get_many(["playlist", "missing"]) == {"playlist": {"name": "Duw do music"}}
+
+    calls = []
+    assert cache.get_or_set("events", lambda: calls.append(1) or [1, 2]) == [1, 2]
+    assert other_cache.get_or_set("events", lambda: calls.append(1) or [3]) == [1, 2]
+    assert len(calls) == 1
+
+
+def test_default_cache_is_private(tmp_path, monkeypatch):
+    path = str(tmp_path / "collaborator" / "cache.sqlite3")
+    monkeypatch.delenv("COLLABORATOR_CACHE_PATH", raising=False)
+    monkeypatch.setattr("collaborator.cache.DEFAULT_CACHE_PATH", path)
+    SharedCache().set("playlist", {"name": "Duw do music"})
+
+    assert os.stat(str(tmp_path / "collaborator")).st_mode & 0o777 == 0o700
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+
+def test_get_or_set_only_creates_value_once_across_processes(tmp_path):
+    cache_path = str(tmp_path / "cache.sqlite3")
+    calls_path = str(tmp_path / "calls.txt")
+    SharedCache(cache_path)
+
+    context = multiprocessing.get_context("fork")
+    start = context.Event()
+    workers = [context.Process(target=get_events, args=(cache_path, calls_path, start)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join(timeout=30)
+
+    assert [worker.exitcode for worker in workers] == [0, 0]
+    with open(calls_path) as calls_file:
+        assert calls_file.read().count("called") == 1
+
+
+def test_expired_values_are_removed_as_the_cache_is_written(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    monkeypatch.setattr("collaborator.cache.CLEAR_EXPIRED_EVERY", 3)
+    cache = SharedCache(path)
+
+    def stored_keys():
+        return sorted(key for key, in sqlite3.connect(path).execute("SELECT key FROM cache"))
+
+    cache.set_many({"expired": 1, "also expired": 2}, ttl=-10)
+    cache.set("forever", 3, ttl=None)
+    assert stored_keys() == ["forever"]
+
+    # Workers also tidy up when they start.
+    cache.set("expired", 1, ttl=-10)
+    SharedCache(path)
+    assert stored_keys() == ["forever"]
@@ -0,0 +1,14 @@
+from collaborator.genres import GenreTaxonomy
+
+
+def test_genre_taxonomy_rules_and_overrides():
+    taxonomy = GenreTaxonomy(overrides={"cerddoriaeth gymraeg": "folk"})
+
+    assert taxonomy.rollup_genre("welsh indie", "parent") == "indie"
+    assert taxonomy.rollup_genre("welsh indie", "family") == "rock"
+    assert taxonomy.rollup_genre("indie rock", "parent") == "rock"
+    assert taxonomy.rollup_genre("uk hip hop", "parent") == "hip hop"
+    assert taxonomy.rollup_genre("rock en espanol", "parent") == "rock"
+    assert taxonomy.rollup_genre("cerddoriaeth gymraeg", "family") == "folk"
+    assert taxonomy.rollup_genre("shoegaze", "parent") == "other"
+    assert taxonomy.rollup_genre("shoegaze", "genre") == "shoegaze"
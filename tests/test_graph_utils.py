@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from collaborator.graph_utils import create_events_table, produce_track_time_series
+
+
+def test_produce_track_time_series_uses_epoch_milliseconds():
+    tracks = [
+        SimpleNamespace(added_at=datetime(2020, 4, 2, tzinfo=timezone.utc)),
+        SimpleNamespace(added_at=datetime(2020, 4, 1, tzinfo=timezone.utc)),
+        SimpleNamespace(added_at=datetime(2020, 4, 2, tzinfo=timezone.utc)),
+    ]
+
+    series = produce_track_time_series(tracks, name="user")
+
+    assert series["x"][:2] == [1585699200000, 1585785600000]
+    assert series["y"] == [1, 3, 3]
+
+
+def test_create_events_table_only_includes_matched_events():
+    def make_event(event_id, artist, start_date, start_datetime):
+        return {
+            "id": event_id,
+            "type": "Concert",
+            "uri": "https://www.songkick.com/concerts/{}".format(event_id),
+            "displayName": artist,
+            "start": {"date": start_date, "datetime": start_datetime},
+            "performance": [{"artist": {"displayName": artist}}],
+            "venue": {"displayName": "Clwb Ifor Bach"},
+            "status": "ok",
+        }
+
+    events = [
+        make_event(1, "Gwenno", "2020-05-02", None),
+        make_event(2, "Nobody", "2020-05-01", "2020-05-01T19:30:00+0100"),
+        make_event(3, "Super Furry Animals", "2020-05-01", "2020-05-01T19:30:00+0100"),
+    ]
+    playlist = SimpleNamespace(is_artist_in_playlist=lambda artist: artist in ("Gwenno", "Super Furry Animals"))
+
+    table = create_events_table(events, playlist)
+
+    assert [(row["artist"], row["date"]) for row in table] == [
+        ("Super Furry Animals", "01 May 2020"),
+        ("Gwenno", "02 May 2020"),
+    ]
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from collaborator.history import PlaylistHistory
+
+
+def make_track(uri, day, user):
+    return SimpleNamespace(
+        uri=uri,
+        added_at=datetime(2020, 4, day, tzinfo=timezone.utc),
+        added_by=SimpleNamespace(uri=user),
+    )
+
+
+def test_history_records_adds_and_removes(tmp_path):
+    first = make_track("spotify:track:1", 6, "spotify:user:a")
+    second = make_track("spotify:track:2", 7, "spotify:user:b")
+    third = make_track("spotify:track:3", 14, "spotify:user:a")
+
+    history = PlaylistHistory(str(tmp_path))
+    assert history.record_snapshot(
+        SimpleNamespace(tracks=[first, second]), observed_at=datetime(2020, 4, 8, tzinfo=timezone.utc)
+    ) == (2, 0)
+    assert history.record_snapshot(
+        SimpleNamespace(tracks=[second, third]), observed_at=datetime(2020, 4, 15, tzinfo=timezone.utc)
+    ) == (1, 1)
+
+    # Reopening the store reads the state back from disk.
+    history = PlaylistHistory(str(tmp_path))
+    assert history.record_snapshot(SimpleNamespace(tracks=[second, third])) == (0, 0)
+
+    assert history.track_count_per_user(on=datetime(2020, 4, 10, tzinfo=timezone.utc)) == {
+        "spotify:user:a": 1,
+        "spotify:user:b": 1,
+    }
+    assert history.track_count_per_user() == {"spotify:user:a": 1, "spotify:user:b": 1}
+    assert history.churn_per_week() == [
+        (datetime(2020, 4, 6, tzinfo=timezone.utc), 2, 0),
+        (datetime(2020, 4, 13, tzinfo=timezone.utc), 1, 1),
+    ]
+    assert [count for _, count in history.track_count_over_time("spotify:user:a")] == [1, 2, 1]
+
+
+def test_history_recovers_from_interrupted_write(tmp_path):
+    first = make_track("spotify:track:1", 6, "spotify:user:a")
+    second = make_track("spotify:track:2", 5, "spotify:user:b")
+
+    history = PlaylistHistory(str(tmp_path))
+    history.record_snapshot(SimpleNamespace(tracks=[first]), observed_at=datetime(2020, 4, 8, tzinfo=timezone.utc))
+
+    # Simulate a snapshot that was interrupted part way through writing its columns.
+    with open(str(tmp_path / "time.col"), "ab") as column_file:
+        column_file.write(b"\x7b" * 8)
+    with open(str(tmp_path / "added_at.col"), "ab") as column_file:
+        column_file.write(b"\x7b" * 3)
+    with open(str(tmp_path / "users.txt"), "a") as table_file:
+        table_file.write("spotify:us")
+
+    history = PlaylistHistory(str(tmp_path))
+    assert history.record_snapshot(
+        SimpleNamespace(tracks=[first, second]), observed_at=datetime(2020, 4, 9, tzinfo=timezone.utc)
+    ) == (1, 0)
+
+    history = PlaylistHistory(str(tmp_path))
+    assert history.user_uris == ["spotify:user:a", "spotify:user:b"]
+    assert history.track_count_over_time() == [
+        (datetime(2020, 4, 5, tzinfo=timezone.utc), 1),
+        (datetime(2020, 4, 6, tzinfo=timezone.utc), 2),
+    ]
+    assert history.churn_per_week() == [
+        (datetime(2020, 3, 30, tzinfo=timezone.utc), 1, 0),
+        (datetime(2020, 4, 6, tzinfo=timezone.utc), 1, 0),
+    ]
@@ -0,0 +1,29 @@
+from collaborator import live_shows
+
+
+def test_get_events_for_locations_deduplicates(monkeypatch):
+    calendars = {
+        "1": [{"id": 10}, {"id": 11}],
+        "2": [{"id": 11}, {"id": 12}],
+    }
+    monkeypatch.setattr(
+        live_shows,
+        "get_events_for_location",
+        lambda location_id, start_date, end_date: calendars[location_id],
+    )
+
+    events = list(live_shows.get_events_for_locations(["1", "2", "1"]))
+
+    assert sorted(event["id"] for event in events) == [10, 11, 12]
+
+
+def test_get_metro_areas_near_skips_areas_without_coordinates(monkeypatch):
+    locations = [
+        {"metroArea": {"id": 24426, "lat": 51.5078, "lng": -0.128}},
+        {"metroArea": {"id": 1, "lat": None, "lng": None}},
+        {"metroArea": {"id": 24426, "lat": 51.5078, "lng": -0.128}},
+        {"metroArea": {"id": 28714, "lat": 53.4794, "lng": -2.2453}},
+    ]
+    monkeypatch.setattr(live_shows, "search_songkick_locations", lambda **kwargs: locations)
+
+    assert live_shows.get_metro_areas_near(51.5, -0.12) == ["24426"]
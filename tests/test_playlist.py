@@ -0,0 +1,248 @@
+import pytest
+
+from collaborator.playlist import SpotifyArtist, SpotifyPlaylist, SpotifyPlaylistTrack
+
+PLAYLIST_JSON = {
+    "uri": "spotify:playlist:1",
+    "collaborative": True,
+    "description": "",
+    "href": "",
+    "id": "1",
+    "name": "Test playlist",
+    "owner": {},
+    "public": True,
+    "tracks": {},
+}
+
+ARTISTS = {
+    "spotify:artist:a": ["indie rock", "welsh indie"],
+    "spotify:artist:b": ["indie rock"],
+    "spotify:artist:c": ["jazz"],
+}
+
+
+def make_track(track_id, artist_uris, added_at, user_id):
+    return SpotifyPlaylistTrack(
+        playlist_track_json={
+            "added_at": added_at,
+            "added_by": {"id": user_id, "uri": "spotify:user:" + user_id},
+            "is_local": False,
+            "track": {
+                "album": {},
+                "artists": [{"uri": uri} for uri in artist_uris],
+                "duration_ms": 1000,
+                "explicit": False,
+                "id": track_id,
+                "name": track_id,
+                "popularity": 50,
+                "preview_url": None,
+                "uri": "spotify:track:" + track_id,
+            },
+        }
+    )
+
+
+def make_playlist(tracks):
+    playlist = SpotifyPlaylist(playlist_json=PLAYLIST_JSON)
+    playlist.tracks = list(tracks)
+    playlist.sort_by_track_info()
+    for uri in playlist.tracks_by_artist:
+        playlist.artists[uri] = SpotifyArtist(
+            artist_json={"uri": uri, "id": uri, "name": uri, "genres": ARTISTS[uri], "popularity": 0}
+        )
+        playlist.artist_names.add(uri)
+    playlist.sort_by_artist_info()
+    return playlist
+
+
+def index_uris(index):
+    return {key: [track.uri for track in tracks] for key, tracks in index.items()}
+
+
+def test_apply_delta_matches_full_sort():
+    first = make_track("1", ["spotify:artist:a"], "2020-04-01T10:00:00Z", "x")
+    second = make_track("2", ["spotify:artist:a", "spotify:artist:b"], "2020-04-03T10:00:00Z", "y")
+    third = make_track("3", ["spotify:artist:c"], "2020-04-05T10:00:00Z", "x")
+    fourth = make_track("4", ["spotify:artist:c"], "2020-04-02T10:00:00Z", "y")
+    fifth = make_track("5", ["spotify:artist:c"], "2020-04-04T10:00:00Z", "y")
+
+    playlist = make_playlist([first, second, third])
+    # Remove a copy of the track to check removals are matched by value.
+    removed = make_track("1", ["spotify:artist:a"], "2020-04-01T10:00:00Z", "x")
+    playlist.apply_delta(added=[fourth, fifth], removed=[removed])
+    expected = make_playlist([second, third, fourth, fifth])
+
+    assert [track.uri for track in playlist.tracks_by_time] == [
+        track.uri for track in expected.tracks_by_time
+    ]
+    for index in ("tracks_by_user", "tracks_by_artist", "tracks_by_genre"):
+        assert index_uris(getattr(playlist, index)) == index_uris(getattr(expected, index))
+    assert playlist.artist_track_counts == expected.artist_track_counts
+    assert playlist.genre_track_counts == expected.genre_track_counts
+    assert playlist.most_used_artist.uri == "spotify:artist:c"
+    assert playlist.most_used_genre == "jazz"
+
+
+def assert_matches_full_sort(playlist, tracks):
+    expected = make_playlist(tracks)
+    assert [track.uri for track in playlist.tracks_by_time] == [track.uri for track in expected.tracks_by_time]
+    for index in ("tracks_by_user", "tracks_by_artist", "tracks_by_genre"):
+        assert index_uris(getattr(playlist, index)) == index_uris(getattr(expected, index))
+    for level in expected.genre_rollups:
+        assert index_uris(playlist.genre_rollups[level]) == index_uris(expected.genre_rollups[level])
+        assert playlist.genre_rollup_counts[level] == expected.genre_rollup_counts[level]
+    assert playlist.genre_track_counts == expected.genre_track_counts
+    assert set(playlist.artists) == set(expected.artists)
+    assert playlist.artist_names == expected.artist_names
+
+
+def test_apply_delta_files_existing_tracks_under_new_artists_genres():
+    first = make_track("1", ["spotify:artist:a"], "2020-04-01T10:00:00Z", "x")
+    second = make_track("2", ["spotify:artist:c"], "2020-04-02T10:00:00Z", "y")
+    third = make_track("3", ["spotify:artist:c"], "2020-04-03T10:00:00Z", "x")
+    playlist = make_playlist([first])
+
+    # Without a connection the artist stays unknown, so the track isn't in any genres yet.
+    playlist.apply_delta(added=[second])
+    assert "jazz" not in playlist.tracks_by_genre
+
+    # Getting the artist's info for another track files both of its tracks under its genres.
+    playlist.apply_delta(added=[third], spotify_connection=FakeSpotify(dict()))
+    assert_matches_full_sort(playlist, [first, second, third])
+    assert [track.uri for track in playlist.query(genre="jazz")] == [second.uri, third.uri]
+
+    playlist.apply_delta(removed=[second])
+    assert_matches_full_sort(playlist, [first, third])
+
+
+def test_apply_delta_keeps_artists_with_swapped_tracks():
+    first = make_track("1", ["spotify:artist:a"], "2020-04-01T10:00:00Z", "x")
+    second = make_track("2", ["spotify:artist:b"], "2020-04-02T10:00:00Z", "y")
+    replacement = make_track("3", ["spotify:artist:a"], "2020-04-03T10:00:00Z", "x")
+    playlist = make_playlist([first, second])
+
+    playlist.apply_delta(added=[replacement], removed=[first])
+    assert_matches_full_sort(playlist, [second, replacement])
+    assert playlist.is_artist_in_playlist("spotify:artist:a")
+
+    # An artist is only dropped once it has no tracks left.
+    playlist.apply_delta(removed=[replacement])
+    assert_matches_full_sort(playlist, [second])
+    assert not playlist.is_artist_in_playlist("spotify:artist:a")
+
+
+def test_removing_a_track_that_is_not_indexed_fails_clearly():
+    from collaborator.playlist import _remove_track
+
+    first = make_track("1", ["spotify:artist:a"], "2020-04-01T10:00:00Z", "x")
+    second = make_track("2", ["spotify:artist:a"], "2020-04-02T10:00:00Z", "x")
+    with pytest.raises(RuntimeError):
+        _remove_track([second], first)
+
+
+def test_query_combines_filters():
+    first = make_track("1", ["spotify:artist:a"], "2020-04-01T10:00:00Z", "x")
+    second = make_track("2", ["spotify:artist:b"], "2020-04-03T10:00:00Z", "x")
+    third = make_track("3", ["spotify:artist:c"], "2020-04-05T10:00:00Z", "x")
+    fourth = make_track("4", ["spotify:artist:b"], "2020-04-04T10:00:00Z", "y")
+    playlist = make_playlist([first, second, third, fourth])
+
+    def uris(tracks):
+        return [track.uri for track in tracks]
+
+    assert uris(playlist.query(user="spotify:user:x", genre="indie rock")) == [first.uri, second.uri]
+    assert uris(playlist.query(genre=["jazz", "welsh indie"])) == [first.uri, third.uri]
+    assert uris(
+        playlist.query(added_between=(second.added_at, fourth.added_at), artist="spotify:artist:b")
+    ) == [second.uri, fourth.uri]
+    assert uris(playlist.query(added_between=(fourth.added_at, None))) == [fourth.uri, third.uri]
+    assert playlist.query(user="spotify:user:z") == []
+
+    playlist.apply_delta(removed=[second])
+    assert uris(playlist.query(genre="indie rock")) == [first.uri, fourth.uri]
+
+
+class FakeSpotify(object):
+    def __init__(self, features):
+        self.features = features
+        self.calls = []
+
+    def audio_features(self, tracks):
+        self.calls.append(tracks)
+        return [self.features.get(uri) for uri in tracks]
+
+    def artists(self, artist_uris):
+        self.calls.append(artist_uris)
+        return {
+            "artists": [
+                {"uri": uri, "id": uri, "name": uri, "genres": ARTISTS[uri], "popularity": 0} for uri in artist_uris
+            ]
+        }
+
+
+def test_audio_features_are_batched_cached_and_aggregated(tmp_path, monkeypatch):
+    from collaborator.cache import SharedCache
+
+    tracks = [
+        make_track(str(number), ["spotify:artist:a"], "2020-04-01T10:00:{:02d}Z".format(number % 60), "x")
+        for number in range(150)
+    ]
+    tracks.append(make_track("no-features", ["spotify:artist:c"], "2020-04-02T10:00:00Z", "y"))
+    features = {
+        track.uri: {"tempo": 100.0 + number % 2, "energy": 0.5, "danceability": 0.25, "valence": 1.0}
+        for number, track in enumerate(tracks[:150])
+    }
+    spotify = FakeSpotify(features)
+    # Expire tracks without features from the cache straight away.
+    monkeypatch.setattr("collaborator.playlist.MISSING_AUDIO_FEATURES_TTL", -1)
+    cache = SharedCache(str(tmp_path / "cache.sqlite3"))
+
+    playlist = make_playlist(tracks)
+    playlist.get_audio_features(spotify, cache=cache)
+    assert sorted(len(call) for call in spotify.calls) == [51, 100]
+    assert tracks[0].audio_features["tempo"] == 100.0
+
+    # Features are in the cache now, so another playlist with the same tracks only needs the API for the track
+    # without features, in case it has some now.
+    make_playlist(tracks).get_audio_features(spotify, cache=cache)
+    assert spotify.calls[2:] == [[tracks[-1].uri]]
+
+    by_user = playlist.audio_feature_aggregates()
+    assert by_user["spotify:user:x"] == {"tempo": 100.5, "energy": 0.5, "danceability": 0.25, "valence": 1.0}
+    assert by_user["spotify:user:y"]["tempo"] != by_user["spotify:user:y"]["tempo"]
+    assert playlist.audio_feature_aggregates(playlist.tracks_by_genre)["welsh indie"]["tempo"] == 100.5
+
+
+def test_sketches_follow_deltas():
+    first = make_track("1", ["spotify:artist:a"], "2020-04-01T10:00:00Z", "x")
+    second = make_track("2", ["spotify:artist:b"], "2020-04-03T10:00:00Z", "y")
+    third = make_track("3", ["spotify:artist:c"], "2020-04-05T10:00:00Z", "x")
+    playlist = make_playlist([first, second])
+    playlist.build_sketches()
+
+    playlist.apply_delta(added=[third], removed=[second])
+    expected = make_playlist([first, third])
+    expected.build_sketches()
+
+    assert playlist.sketch.hashvalues == expected.sketch.hashvalues
+    assert {user: sketch.hashvalues for user, sketch in playlist.user_sketches.items()} == {
+        user: sketch.hashvalues for user, sketch in expected.user_sketches.items()
+    }
+
+
+def test_genre_rollups_follow_deltas():
+    first = make_track("1", ["spotify:artist:a"], "2020-04-01T10:00:00Z", "x")
+    second = make_track("2", ["spotify:artist:b"], "2020-04-03T10:00:00Z", "y")
+    third = make_track("3", ["spotify:artist:c"], "2020-04-05T10:00:00Z", "x")
+    playlist = make_playlist([first, second])
+
+    # "welsh indie" and "indie rock" both roll up to "rock", but each track is only counted once.
+    assert index_uris(playlist.genre_rollups["family"]) == {"rock": [first.uri, second.uri]}
+    assert playlist.genre_rollup_counts["parent"] == {"indie": 1, "rock": 2}
+
+    playlist.artists.update(make_playlist([third]).artists)
+    playlist.apply_delta(added=[third], removed=[first])
+    expected = make_playlist([second, third])
+    for level in expected.genre_rollups:
+        assert index_uris(playlist.genre_rollups[level]) == index_uris(expected.genre_rollups[level])
+        assert playlist.genre_rollup_counts[level] == expected.genre_rollup_counts[level]
@@ -0,0 +1,33 @@
+from collaborator.similarity import MinHash, build_similarity_index
+
+
+def test_minhash_estimates_jaccard():
+    first = MinHash("spotify:track:{}".format(number) for number in range(100))
+    second = MinHash("spotify:track:{}".format(number) for number in range(50, 150))
+
+    # The true similarity is 50 / 150.
+    assert abs(first.jaccard(second) - 1 / 3) < 0.15
+    assert MinHash.from_bytes(first.to_bytes()).jaccard(first) == 1.0
+
+    # Updating incrementally gives the same sketch as building it in one go.
+    incremental = MinHash("spotify:track:{}".format(number) for number in range(50))
+    incremental.update("spotify:track:{}".format(number) for number in range(50, 100))
+    assert incremental.hashvalues == first.hashvalues
+
+
+def test_lsh_finds_similar_sketches():
+    sketches = {
+        "a": MinHash("spotify:track:{}".format(number) for number in range(100)),
+        "b": MinHash("spotify:track:{}".format(number) for number in range(5, 105)),
+        "c": MinHash("spotify:track:{}".format(number) for number in range(1000, 1100)),
+    }
+    index = build_similarity_index(sketches)
+
+    assert [key for key, _ in index.most_similar(sketches["a"])][:2] == ["a", "b"]
+    assert "c" not in index.query(sketches["a"])
+
+    # Sketches updated after they're inserted can be re-inserted.
+    sketches["c"].update("spotify:track:{}".format(number) for number in range(100))
+    index.insert("c", sketches["c"])
+    index.remove("b")
+    assert "b" not in index.query(sketches["a"])
@@ -0,0 +1,15 @@
+import subprocess
+import sys
+
+SLOW_MODULES = ("spotipy", "requests", "dash", "dateutil")
+
+
+def test_startup_does_not_import_slow_modules():
+    # Run in a fresh interpreter as other tests will already have imported things.
+    code = (
+        "import sys, collaborator.graph_utils, collaborator.cli;"
+        "print(','.join(module for module in {} if module in sys.modules))".format(SLOW_MODULES)
+    )
+    output = subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.PIPE)
+
+    assert output.stdout.decode().strip() == ""
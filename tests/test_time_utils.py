@@ -0,0 +1,14 @@
+from datetime import datetime, timedelta, timezone
+
+from collaborator.time_utils import parse_timestamps
+
+
+def test_parse_timestamps():
+    assert parse_timestamps(
+        ["2020-04-01T10:00:00Z", "2020-04-01T19:30:00+0100", "2020-04-01", "2020-04-01T10:00:00.5Z"]
+    ) == [
+        datetime(2020, 4, 1, 10, tzinfo=timezone.utc),
+        datetime(2020, 4, 1, 19, 30, tzinfo=timezone(timedelta(hours=1))),
+        datetime(2020, 4, 1),
+        datetime(2020, 4, 1, 10, 0, 0, 500000, tzinfo=timezone.utc),
+    ]